@@ -1,10 +1,7 @@
 import logging
-import os
 import random
-import tempfile
 from datetime import timedelta
 from functools import update_wrapper
-from threading import Thread
 from typing import Any
 
 from django.apps import apps
@@ -15,8 +12,7 @@ from django.core.exceptions import PermissionDenied
 from django.core.files import File
 from django.core.files.uploadedfile import UploadedFile
 from django.db import models
-from django.db.models import Count, F, FloatField, OuterRef, Q, Subquery, Sum
-from django.db.models.functions import Cast
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
 from django.forms import ClearableFileInput, ModelChoiceField
 from django.http import HttpRequest, HttpResponseRedirect
 from django.template.response import TemplateResponse
@@ -29,18 +25,23 @@ from pydub import AudioSegment
 from spodcat.admin_inlines import (
     ArtistSongInline,
     EpisodeChapterInline,
+    EpisodeRenditionInline,
     EpisodeSongInline,
+    JobInline,
     PodcastLinkInline,
 )
 from spodcat.contrib.admin.filters import ArtistSongCountFilter
 from spodcat.contrib.admin.mixin import AdminMixin
 from spodcat.forms import PodcastAdminForm, PodcastChangeSlugForm
+from spodcat.jobs import start_in_process_worker
 from spodcat.models import (
     Artist,
     Comment,
     Episode,
     EpisodeSong,
     FontFace,
+    Job,
+    JobStatus,
     Podcast,
     Post,
 )
@@ -178,19 +179,19 @@ class PodcastAdmin(AdminMixin, admin.ModelAdmin):
 
     @admin.display(description=_("plays"), ordering="play_count")
     def play_count(self, obj):
-        from spodcat.logs.models import PodcastEpisodeAudioRequestLog
+        from spodcat.logs.models import ListeningSession
 
         play_count = (
-            PodcastEpisodeAudioRequestLog.objects
+            ListeningSession.objects
             .filter(is_bot=False, episode__podcast=obj)
-            .aggregate(play_count=Sum(Cast(F("response_body_size"), FloatField()) / F("episode__audio_file_length")))
+            .aggregate(play_count=Sum("covered_fraction"))
         )["play_count"]
 
         if play_count is None:
             return 0.0
 
         return self.get_changelist_link(
-            model=PodcastEpisodeAudioRequestLog,
+            model=ListeningSession,
             text=round(play_count, 2),
             episode__podcast__slug__exact=obj.pk,
             is_bot__exact=0,
@@ -198,11 +199,11 @@ class PodcastAdmin(AdminMixin, admin.ModelAdmin):
 
     @admin.display(description=_("players"), ordering="player_count")
     def player_count(self, obj):
-        from spodcat.logs.models import PodcastEpisodeAudioRequestLog
+        from spodcat.logs.models import ListeningSession
 
         player_count = (
-            PodcastEpisodeAudioRequestLog.objects
-            .filter(is_bot=False, response_body_size__gt=0, episode__podcast=obj)
+            ListeningSession.objects
+            .filter(is_bot=False, bytes_covered__gt=0, episode__podcast=obj)
             .aggregate(player_count=Count("remote_addr", distinct=True))
         )["player_count"]
 
@@ -307,12 +308,21 @@ class EpisodeAdmin(BasePodcastContentAdmin):
         "image",
         "description",
         "duration",
+        ("loudness_lufs", "true_peak_dbfs"),
         "audio_content_type",
         "audio_file_length",
     ]
-    inlines = [EpisodeSongInline, EpisodeChapterInline]
+    inlines = [EpisodeSongInline, EpisodeChapterInline, EpisodeRenditionInline, JobInline]
     list_filter = ["is_draft", "published", "podcast"]
-    readonly_fields = ["audio_content_type", "audio_file_length", "slug", "duration", "id"]
+    readonly_fields = [
+        "audio_content_type",
+        "audio_file_length",
+        "slug",
+        "duration",
+        "id",
+        "loudness_lufs",
+        "true_peak_dbfs",
+    ]
     search_fields = ["name", "description", "slug", "songs__title", "songs__artists__name"]
 
     def apply_gain(self, instance: Episode, audio: AudioSegment, stem: str, tags: Any, save: bool = True) -> bool:
@@ -371,39 +381,33 @@ class EpisodeAdmin(BasePodcastContentAdmin):
         ]
 
     def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+
+        # Heavy fields are deferred by default, but the change form has the
+        # description.
+        if request.resolver_match and request.resolver_match.url_name == "spodcat_episode_change":
+            queryset = queryset.with_heavy_fields("description")
+
         if apps.is_installed("spodcat.logs"):
-            from spodcat.logs.models import PodcastEpisodeAudioRequestLog
+            from spodcat.logs.models import ListeningSession
 
             return (
-                super().get_queryset(request)
+                queryset
                 .annotate(
                     play_count=Subquery(
-                        PodcastEpisodeAudioRequestLog.objects
+                        ListeningSession.objects
                         .filter(is_bot=False)
                         .get_play_count_query(episode=OuterRef("pk"))
                     ),
                     player_count=Count(
-                        "audio_requests__remote_addr",
+                        "listening_sessions__remote_addr",
                         distinct=True,
-                        filter=Q(audio_requests__is_bot=False, audio_requests__response_body_size__gt=0),
+                        filter=Q(listening_sessions__is_bot=False, listening_sessions__bytes_covered__gt=0),
                     ),
                 )
             )
 
-        return super().get_queryset(request)
-
-    def handle_audio_file_async(self, instance: Episode, temp_file: tempfile._TemporaryFileWrapper):
-        logger.info("handle_audio_file_async starting for %s, temp_file=%s", instance, temp_file)
-
-        try:
-            instance.get_dbfs_and_duration(temp_file=temp_file)
-            # Skipping the applying of gain, but here is how to use it:
-            # temp_stem, _ = os.path.splitext(temp_file.name)
-            # if self.apply_gain(instance=instance, audio=audio, stem=temp_stem, tags=info.get("TAG"), save=False):
-            #     update_fields.extend(["audio_file", "audio_content_type", "audio_file_length"])
-            logger.info("handle_audio_file_async finished for %s", instance)
-        except Exception as e:
-            logger.error("handle_audio_file_async error", exc_info=e)
+        return queryset
 
     @admin.display(description=_("number"), ordering="number")
     def number_string(self, obj: Episode):
@@ -411,13 +415,13 @@ class EpisodeAdmin(BasePodcastContentAdmin):
 
     @admin.display(description=_("plays"), ordering="play_count")
     def play_count(self, obj):
-        from spodcat.logs.models import PodcastEpisodeAudioRequestLog
+        from spodcat.logs.models import ListeningSession
 
         if obj.play_count is None:
             return 0.0
 
         return self.get_changelist_link(
-            model=PodcastEpisodeAudioRequestLog,
+            model=ListeningSession,
             text=round(obj.play_count, 2),
             episode__podcastcontent_ptr__exact=obj.pk,
             is_bot__exact=0,
@@ -437,7 +441,8 @@ class EpisodeAdmin(BasePodcastContentAdmin):
         if "image" in form.changed_data:
             if "image" in form.initial:
                 delete_storage_file(form.initial["image"])
-            instance.handle_uploaded_image()
+            if not form.cleaned_data["image"]:
+                instance.handle_uploaded_image()
         if "audio_file" in form.changed_data:
             if "audio_file" in form.initial:
                 delete_storage_file(form.initial["audio_file"])
@@ -445,11 +450,14 @@ class EpisodeAdmin(BasePodcastContentAdmin):
                 audio_file: UploadedFile = form.cleaned_data["audio_file"]
                 instance.audio_content_type = audio_file.content_type
                 instance.audio_file_length = audio_file.size
+                instance.probe_audio_file(audio_file)
             else:
                 instance.duration_seconds = 0.0
                 instance.audio_content_type = ""
                 instance.audio_file_length = 0
                 instance.dbfs_array = []
+                instance.loudness_lufs = None
+                instance.true_peak_dbfs = None
 
         logger.info("save_form finished for %s with audio_file=%s", instance, instance.audio_file)
         return instance
@@ -457,24 +465,19 @@ class EpisodeAdmin(BasePodcastContentAdmin):
     def save_model(self, request, obj: Episode, form, change):
         super().save_model(request, obj, form, change)
 
-        if "audio_file" in form.changed_data and form.cleaned_data["audio_file"]:
-            audio_file: UploadedFile = form.cleaned_data["audio_file"]
-            _, extension = os.path.splitext(os.path.basename(audio_file.name))
-
-            # Cannot send the UploadedFile itself, because it may be closed
-            # once the thread runs.
-            # pylint: disable=consider-using-with
-            temp_file = tempfile.NamedTemporaryFile(suffix=extension)
-            audio_file.seek(0)
-            temp_file.write(audio_file.read())
-            temp_file.seek(0)
+        if "image" in form.changed_data and form.cleaned_data["image"]:
+            Job.enqueue("episode_image_thumbnail", episode=obj)
 
-            logger.info("save_model start thread for %s with audio_file=%s, temp_file=%s", obj, audio_file, temp_file)
+        if "audio_file" in form.changed_data and not form.cleaned_data["audio_file"]:
+            obj.waveforms.all().delete()
+            for rendition in obj.renditions.all():
+                rendition.delete()
 
-            Thread(
-                target=self.handle_audio_file_async,
-                kwargs={"instance": obj, "temp_file": temp_file},
-            ).start()
+        if "audio_file" in form.changed_data and form.cleaned_data["audio_file"]:
+            # Skipping the applying of gain, but it could be done here with
+            # self.apply_gain().
+            logger.info("save_model queueing audio processing for %s with audio_file=%s", obj, obj.audio_file)
+            obj.queue_audio_jobs()
 
 
 @admin.register(Post)
@@ -647,3 +650,41 @@ class FontFaceAdmin(AdminMixin, admin.ModelAdmin):
                 delete_storage_file(form.initial["file"])
 
         return instance
+
+
+@admin.register(Job)
+class JobAdmin(AdminMixin, admin.ModelAdmin):
+    actions = ["retry"]
+    list_display = ["created", "task", "episode_link", "status", "attempts", "started", "finished"]
+    list_filter = ["status", "task"]
+    readonly_fields = [
+        "attempts",
+        "created",
+        "episode",
+        "error",
+        "finished",
+        "kwargs",
+        "max_attempts",
+        "run_after",
+        "started",
+        "status",
+        "task",
+    ]
+
+    @admin.display(description=_("episode"), ordering="episode__name")
+    def episode_link(self, obj: Job):
+        if obj.episode:
+            return self.get_change_link(obj.episode)
+        return None
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("episode")
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description=_("Retry selected jobs"))
+    def retry(self, request, queryset):
+        for job in queryset.exclude(status=JobStatus.RUNNING):
+            job.retry()
+        start_in_process_worker()
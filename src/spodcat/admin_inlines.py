@@ -4,7 +4,14 @@ from django.utils.translation import gettext_lazy as _
 from spodcat.contrib.admin.mixin import AdminMixin
 from spodcat.contrib.admin.widgets import ArtistAutocompleteWidget
 from spodcat.form_fields import ArtistMultipleChoiceField
-from spodcat.models import Artist, EpisodeChapter, EpisodeSong, PodcastLink
+from spodcat.models import (
+    Artist,
+    EpisodeChapter,
+    EpisodeRendition,
+    EpisodeSong,
+    Job,
+    PodcastLink,
+)
 
 
 class ArtistSongInline(AdminMixin, admin.TabularInline):
@@ -60,6 +67,34 @@ class EpisodeChapterInline(AdminMixin, admin.TabularInline):
     fields = ["episode", "start_time", "end_time", "title", "url", "image"]
 
 
+class EpisodeRenditionInline(AdminMixin, admin.TabularInline):
+    extra = 0
+    fields = ["name", "audio_file", "content_type", "bit_rate", "length", "created"]
+    model = EpisodeRendition
+    readonly_fields = ["name", "audio_file", "content_type", "bit_rate", "length", "created"]
+
+    def has_add_permission(self, request, obj):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class JobInline(AdminMixin, admin.TabularInline):
+    extra = 0
+    fields = ["task", "status", "attempts", "created", "finished", "error"]
+    model = Job
+    readonly_fields = ["task", "status", "attempts", "created", "finished", "error"]
+    verbose_name = _("processing job")
+    verbose_name_plural = _("processing jobs")
+
+    def has_add_permission(self, request, obj):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 class PodcastLinkInline(AdminMixin, admin.TabularInline):
     model = PodcastLink
     extra = 0
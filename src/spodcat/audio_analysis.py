@@ -0,0 +1,204 @@
+"""
+Single pass audio analysis: one ffmpeg process reads the file once, and
+gives us container/codec metadata and loudness (on stderr) as well as
+decoded PCM for the waveform (on stdout).
+"""
+import logging
+import re
+import subprocess
+import threading
+from dataclasses import dataclass, field
+
+from pydub import AudioSegment
+
+from spodcat.waveform import (
+    BUCKET_COUNT,
+    CHUNK_SIZE,
+    PYRAMID_RESOLUTIONS,
+    SAMPLE_WIDTH,
+    DbfsAccumulator,
+    FineDbfsAccumulator,
+    get_bucket_ms,
+    get_samples,
+    get_squares,
+    normalize_dbfs_values,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# PCM is always output as stereo. Mono is upmixed by duplicating samples,
+# which doesn't change the RMS.
+OUTPUT_CHANNELS = 2
+HEADER_TIMEOUT = 30
+
+DURATION_RE = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+BITRATE_RE = re.compile(r"bitrate: (\d+) kb/s")
+FORMAT_RE = re.compile(r"^Input #0, (.+), from ")
+STREAM_RE = re.compile(r"Stream #0:\d+\S*: Audio: (\w+).*?, (\d+) Hz, ([^,]+)")
+INTEGRATED_RE = re.compile(r"^\s*I:\s+(-?[\d.]+|-inf) LUFS")
+PEAK_RE = re.compile(r"^\s*Peak:\s+(-?[\d.]+|-inf) dBFS")
+
+CHANNEL_LAYOUTS = {"mono": 1, "stereo": 2, "2.1": 3, "quad": 4, "5.0": 5, "5.1": 6, "7.1": 8}
+
+
+@dataclass
+class AudioAnalysis:
+    bit_rate: int | None = None
+    channels: int | None = None
+    codec_name: str = ""
+    dbfs_array: list[float] = field(default_factory=list)
+    duration_seconds: float = 0.0
+    format_name: str = ""
+    loudness_lufs: float | None = None
+    sample_rate: int | None = None
+    true_peak_dbfs: float | None = None
+    # Normalized dBFS arrays keyed by bucket count, for EpisodeWaveform.
+    waveforms: dict[int, list[float]] = field(default_factory=dict)
+
+
+class StderrParser:
+    """
+    Collects what we need from ffmpeg's log output, in a thread of its own
+    so neither pipe can fill up and block the process.
+    """
+    def __init__(self, analysis: AudioAnalysis):
+        self.analysis = analysis
+        self.header_ready = threading.Event()
+        self.in_output = False
+        self.in_true_peak = False
+        self.lines: list[str] = []
+        self.output_sample_rate: int | None = None
+
+    def parse_line(self, line: str):
+        analysis = self.analysis
+
+        if self.in_output:
+            if m := STREAM_RE.search(line):
+                # The sample rate of the PCM we get, which should be the same
+                # as the input's, but let's not assume.
+                self.output_sample_rate = int(m.group(2))
+                self.in_output = False
+                self.header_ready.set()
+        elif m := FORMAT_RE.match(line):
+            analysis.format_name = m.group(1)
+        elif m := DURATION_RE.search(line):
+            hours, minutes, seconds = m.groups()
+            analysis.duration_seconds = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+            if b := BITRATE_RE.search(line):
+                analysis.bit_rate = int(b.group(1)) * 1000
+        elif (m := STREAM_RE.search(line)) and not analysis.codec_name:
+            analysis.codec_name = m.group(1)
+            analysis.sample_rate = int(m.group(2))
+            layout = m.group(3).strip()
+            channels = re.match(r"(\d+) channels", layout)
+            analysis.channels = int(channels.group(1)) if channels else CHANNEL_LAYOUTS.get(layout.split("(")[0])
+        elif line.startswith("Output #0"):
+            self.in_output = True
+        elif m := INTEGRATED_RE.match(line):
+            analysis.loudness_lufs = parse_float(m.group(1))
+        elif line.strip() == "True peak:":
+            self.in_true_peak = True
+        elif self.in_true_peak and (m := PEAK_RE.match(line)):
+            analysis.true_peak_dbfs = parse_float(m.group(1))
+            self.in_true_peak = False
+
+    def read(self, stream):
+        try:
+            for raw_line in stream:
+                line = raw_line.decode(errors="replace").rstrip()
+                self.lines.append(line)
+                self.parse_line(line)
+        finally:
+            self.header_ready.set()
+
+
+def analyze_audio(
+    path: str,
+    bucket_count: int = BUCKET_COUNT,
+    pyramid_resolutions: tuple[int, ...] = PYRAMID_RESOLUTIONS,
+) -> AudioAnalysis:
+    """
+    Reads the audio file at `path` once and returns its metadata, integrated
+    loudness, true peak, normalized dBFS array, and a dBFS array for each
+    of `pyramid_resolutions`. Memory use is constant regardless of file
+    length.
+    """
+    analysis = AudioAnalysis()
+    parser = StderrParser(analysis)
+    command = [
+        AudioSegment.converter,
+        "-nostdin",
+        "-nostats",
+        "-hide_banner",
+        "-i", path,
+        "-map", "0:a:0",
+        "-af", "ebur128=peak=true:framelog=quiet",
+        "-ac", str(OUTPUT_CHANNELS),
+        "-f", "s16le",
+        "-acodec", "pcm_s16le",
+        "pipe:1",
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stderr_thread = threading.Thread(target=parser.read, args=(process.stderr,), daemon=True)
+    stderr_thread.start()
+    accumulators: dict[int, DbfsAccumulator] = {}
+    fine_accumulator: FineDbfsAccumulator | None = None
+    frame_count = 0
+
+    try:
+        assert process.stdout
+        while chunk := process.stdout.read(CHUNK_SIZE):
+            if not accumulators and not fine_accumulator:
+                # ffmpeg logs the input info before it starts writing output.
+                parser.header_ready.wait(HEADER_TIMEOUT)
+                output_sample_rate = parser.output_sample_rate or analysis.sample_rate or 44100
+                if analysis.duration_seconds:
+                    accumulators = {
+                        count: DbfsAccumulator(
+                            bucket_ms=get_bucket_ms(analysis.duration_seconds, count),
+                            sample_rate=output_sample_rate,
+                            channels=OUTPUT_CHANNELS,
+                            bucket_count=count,
+                        )
+                        for count in {bucket_count, *pyramid_resolutions}
+                    }
+                else:
+                    # Bucket lengths depend on the duration, so we have to
+                    # wait until everything is decoded.
+                    fine_accumulator = FineDbfsAccumulator(output_sample_rate, OUTPUT_CHANNELS)
+            squares = get_squares(get_samples(chunk, SAMPLE_WIDTH))
+            for accumulator in accumulators.values():
+                accumulator.add_squares(squares)
+            if fine_accumulator:
+                fine_accumulator.add_squares(squares)
+            frame_count += len(squares) // OUTPUT_CHANNELS
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+        stderr_thread.join()
+
+    if returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with code {returncode}: {' '.join(parser.lines[-5:])}")
+
+    if fine_accumulator:
+        # No duration in the container; rely on what was decoded instead.
+        # ebur128 resamples, so frames are counted at the output rate.
+        analysis.duration_seconds = frame_count / fine_accumulator.sample_rate
+        logger.warning("No duration in header of %s, using decoded length", path)
+        values = {
+            count: normalize_dbfs_values(fine_accumulator.get_dbfs_values(count))
+            for count in {bucket_count, *pyramid_resolutions}
+        }
+    else:
+        values = {count: normalize_dbfs_values(a.finish()) for count, a in accumulators.items()}
+
+    if values:
+        analysis.dbfs_array = values[bucket_count]
+        analysis.waveforms = {count: values[count] for count in pyramid_resolutions}
+
+    return analysis
+
+
+def parse_float(value: str) -> float | None:
+    return None if value == "-inf" else float(value)
@@ -0,0 +1,312 @@
+"""
+Fast audio metadata extraction that only reads file headers: ID3v2 tag and
+first frame (with Xing/Info/VBRI header if any) for MP3, and the moov/mvhd
+box for MP4/M4A. Files are read through a RangeReader, so for files in
+remote storage only the needed byte ranges are fetched over HTTP. Anything
+this can't handle is left to the full decode in spodcat.audio_analysis.
+"""
+import logging
+import struct
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+
+import requests
+from django.core.files import File
+from django.db.models.fields.files import FieldFile
+
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 64 * 1024
+MAX_BOXES = 100
+# How far into the audio data we look for the first MP3 frame.
+MAX_SYNC_SCAN = 64 * 1024
+
+MP3_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 25: [11025, 12000, 8000]}
+
+
+class ProbeError(Exception):
+    ...
+
+
+@dataclass
+class AudioHeaderInfo:
+    duration_seconds: float
+    format_name: str
+    size: int
+    bit_rate: int | None = None
+    sample_rate: int | None = None
+
+
+@dataclass
+class Mp3FrameHeader:
+    bit_rate: int
+    channels: int
+    layer: int
+    padding: int
+    sample_rate: int
+    version: int
+
+    @property
+    def frame_length(self) -> int:
+        if self.layer == 1:
+            return (12 * self.bit_rate // self.sample_rate + self.padding) * 4
+        if self.layer == 3 and self.version != 1:
+            return 72 * self.bit_rate // self.sample_rate + self.padding
+        return 144 * self.bit_rate // self.sample_rate + self.padding
+
+    @property
+    def samples_per_frame(self) -> int:
+        if self.layer == 1:
+            return 384
+        if self.layer == 3 and self.version != 1:
+            return 576
+        return 1152
+
+    @property
+    def side_info_length(self) -> int:
+        if self.version == 1:
+            return 17 if self.channels == 1 else 32
+        return 9 if self.channels == 1 else 17
+
+
+class RangeReader(ABC):
+    """Reads byte ranges from some source, caching one block at a time."""
+    size: int
+
+    def __init__(self, block_size: int = BLOCK_SIZE):
+        self.block_size = block_size
+        self.buffer = b""
+        self.buffer_offset = 0
+
+    def close(self):
+        ...
+
+    def read(self, offset: int, length: int) -> bytes:
+        if offset >= self.size:
+            return b""
+        end = min(offset + length, self.size)
+        if offset < self.buffer_offset or end > self.buffer_offset + len(self.buffer):
+            self.buffer = self.read_range(offset, max(end - offset, self.block_size))
+            self.buffer_offset = offset
+        return self.buffer[offset - self.buffer_offset:end - self.buffer_offset]
+
+    @abstractmethod
+    def read_range(self, offset: int, length: int) -> bytes:
+        ...
+
+
+class FileRangeReader(RangeReader):
+    def __init__(self, file: File, block_size: int = BLOCK_SIZE):
+        super().__init__(block_size)
+        self.file = file
+        # Closing some files, like uploads in temporary files, deletes them;
+        # so only close what we opened.
+        self.was_closed = file.closed
+        file.open("rb")
+        self.size = file.seek(0, 2)
+
+    def close(self):
+        if self.was_closed:
+            self.file.close()
+
+    def read_range(self, offset: int, length: int) -> bytes:
+        self.file.seek(offset)
+        return self.file.read(length)
+
+
+class HttpRangeReader(RangeReader):
+    def __init__(self, url: str, timeout: float = 10, block_size: int = BLOCK_SIZE):
+        super().__init__(block_size)
+        self.session = requests.Session()
+        self.timeout = timeout
+        self.url = url
+        # Fetches the first block, and the total size from Content-Range.
+        self.buffer = self.read_range(0, block_size)
+
+    def close(self):
+        self.session.close()
+
+    def read_range(self, offset: int, length: int) -> bytes:
+        response = self.session.get(
+            self.url,
+            headers={"Range": f"bytes={offset}-{offset + length - 1}"},
+            timeout=self.timeout,
+        )
+        if response.status_code != 206:
+            # The server ignored the Range header; don't download the lot.
+            response.close()
+            raise ProbeError(f"Range requests not supported for {self.url} ({response.status_code})")
+        self.size = int(response.headers.get("Content-Range", "").rpartition("/")[2])
+        return response.content
+
+
+def find_mp4_box(reader: RangeReader, box_type: bytes, start: int, end: int) -> tuple[int, int] | None:
+    """Returns the content start and end offsets of the first matching box."""
+    offset = start
+
+    for _ in range(MAX_BOXES):
+        if offset + 8 > end:
+            return None
+        size, found_type = struct.unpack(">I4s", reader.read(offset, 8))
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", reader.read(offset + 8, 8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            raise ProbeError(f"Invalid box size {size} at {offset}")
+        if found_type == box_type:
+            return offset + header_size, offset + size
+        offset += size
+
+    return None
+
+
+def get_range_reader(file: File) -> RangeReader:
+    """
+    Files in storage that has no local path are read with HTTP range
+    requests, since opening them (e.g. with Azure storage) may download
+    the whole file.
+    """
+    if isinstance(file, FieldFile) and file._committed:
+        try:
+            file.storage.path(file.name)
+        except NotImplementedError:
+            url = file.url
+            if url.startswith(("http://", "https://")):
+                return HttpRangeReader(url)
+
+    return FileRangeReader(file)
+
+
+def parse_mp3_frame_header(data: bytes) -> Mp3FrameHeader | None:
+    if len(data) < 4 or data[0] != 0xFF or data[1] & 0xE0 != 0xE0:
+        return None
+
+    version = {0: 25, 2: 2, 3: 1}.get((data[1] >> 3) & 3)
+    layer = {1: 3, 2: 2, 3: 1}.get((data[1] >> 1) & 3)
+    bit_rate_index = data[2] >> 4
+    sample_rate_index = (data[2] >> 2) & 3
+    if version is None or layer is None or bit_rate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    return Mp3FrameHeader(
+        bit_rate=MP3_BITRATES[(min(version, 2), layer)][bit_rate_index] * 1000,
+        channels=1 if data[3] >> 6 == 3 else 2,
+        layer=layer,
+        padding=(data[2] >> 1) & 1,
+        sample_rate=MP3_SAMPLE_RATES[version][sample_rate_index],
+        version=version,
+    )
+
+
+def probe_audio_file(file: File) -> AudioHeaderInfo | None:
+    """
+    Returns None if the file format isn't supported or headers are missing.
+    """
+    try:
+        reader = get_range_reader(file)
+        try:
+            return probe_reader(reader)
+        finally:
+            reader.close()
+    except (ProbeError, OSError, IndexError, ValueError, struct.error, requests.RequestException) as e:
+        logger.info("Could not probe %s: %s", file.name, e)
+        return None
+
+
+def probe_mp3(reader: RangeReader) -> AudioHeaderInfo:
+    start = 0
+    header = reader.read(0, 10)
+
+    # Skip any ID3v2 tags, whose size is "syncsafe" (7 bits per byte).
+    while header[:3] == b"ID3":
+        size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+        start += 10 + size + (10 if header[5] & 0x10 else 0)
+        header = reader.read(start, 10)
+
+    data = reader.read(start, MAX_SYNC_SCAN)
+    for index in range(len(data) - 4):
+        frame = parse_mp3_frame_header(data[index:index + 4])
+        # Require the next frame to be where this one says, as a guard
+        # against random data that happens to look like a frame header.
+        if frame and parse_mp3_frame_header(reader.read(start + index + frame.frame_length, 4)):
+            start += index
+            break
+    else:
+        raise ProbeError("No MP3 frame found")
+
+    first_frame = reader.read(start, frame.frame_length)
+    frame_count = None
+
+    xing_offset = 4 + frame.side_info_length
+    if first_frame[xing_offset:xing_offset + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", first_frame[xing_offset + 4:xing_offset + 8])[0]
+        if flags & 1:
+            frame_count = struct.unpack(">I", first_frame[xing_offset + 8:xing_offset + 12])[0]
+    elif first_frame[36:40] == b"VBRI":
+        frame_count = struct.unpack(">I", first_frame[50:54])[0]
+
+    if frame_count:
+        duration = frame_count * frame.samples_per_frame / frame.sample_rate
+        bit_rate = round((reader.size - start) * 8 / duration)
+    else:
+        # No VBR header, so assume constant bitrate.
+        audio_size = reader.size - start
+        if reader.size >= 128 and reader.read(reader.size - 128, 3) == b"TAG":
+            audio_size -= 128
+        duration = audio_size * 8 / frame.bit_rate
+        bit_rate = frame.bit_rate
+
+    return AudioHeaderInfo(
+        bit_rate=bit_rate,
+        duration_seconds=duration,
+        format_name="mp3",
+        sample_rate=frame.sample_rate,
+        size=reader.size,
+    )
+
+
+def probe_mp4(reader: RangeReader) -> AudioHeaderInfo:
+    moov = find_mp4_box(reader, b"moov", 0, reader.size)
+    if moov is None:
+        raise ProbeError("No moov box found")
+    mvhd = find_mp4_box(reader, b"mvhd", *moov)
+    if mvhd is None:
+        raise ProbeError("No mvhd box found")
+
+    offset, _ = mvhd
+    version = reader.read(offset, 1)[0]
+    if version == 1:
+        timescale, duration = struct.unpack(">IQ", reader.read(offset + 20, 12))
+    else:
+        timescale, duration = struct.unpack(">II", reader.read(offset + 12, 8))
+    if not timescale:
+        raise ProbeError("mvhd timescale is 0")
+
+    return AudioHeaderInfo(
+        bit_rate=round(reader.size * 8 / (duration / timescale)) if duration else None,
+        duration_seconds=duration / timescale,
+        format_name="mp4",
+        size=reader.size,
+    )
+
+
+def probe_reader(reader: RangeReader) -> AudioHeaderInfo:
+    head = reader.read(0, 12)
+
+    if head[4:8] == b"ftyp":
+        return probe_mp4(reader)
+    if head[:3] == b"ID3" or parse_mp3_frame_header(head[:4]):
+        return probe_mp3(reader)
+    raise ProbeError("Unsupported format")
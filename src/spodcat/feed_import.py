@@ -0,0 +1,226 @@
+"""
+Fetching of media for feed imports. Episode images and enclosures are
+downloaded to temporary files by a Downloader, which is safe to share
+between threads, so import_rss can fetch several episodes at once and then
+apply them to the database one at a time. Downloads are streamed to disk,
+so memory use doesn't depend on file size, and interrupted transfers are
+resumed with Range requests where the server supports it.
+"""
+import hashlib
+import json
+import logging
+import mimetypes
+import tempfile
+from dataclasses import dataclass, field
+from typing import IO
+
+import feedparser
+import requests
+from klaatu_python.utils import getitem0_nullable
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+logger = logging.getLogger(__name__)
+
+AUDIO_TIMEOUT = 60
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+IMAGE_TIMEOUT = 10
+MAX_RESUMES = 5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+@dataclass
+class DownloadedFile:
+    content_type: str
+    file: IO[bytes]
+    length: int
+    sha256: str
+    url: str
+
+    @property
+    def suffix(self) -> str:
+        if not self.content_type:
+            return ""
+        return mimetypes.guess_extension(self.content_type) or ("." + self.content_type.split("/")[-1])
+
+    def close(self):
+        self.file.close()
+
+
+@dataclass
+class EntryMedia:
+    """
+    Downloaded files for a feed entry; None where there was nothing to get,
+    or the download failed, in which case the URL is in `failed_urls`.
+    """
+    audio: DownloadedFile | None = None
+    failed_urls: list[str] = field(default_factory=list)
+    image: DownloadedFile | None = None
+
+    def close(self):
+        for downloaded in (self.audio, self.image):
+            if downloaded:
+                downloaded.close()
+
+
+class Downloader:
+    """
+    A requests session that retries failed requests with exponential
+    backoff, and never has more than `max_per_host` connections open to the
+    same host; threads wanting more will wait for one to be released.
+    """
+    def __init__(self, max_per_host: int = 4, retries: int = 3, backoff_factor: float = 1.0):
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=["GET"],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_maxsize=max_per_host, pool_block=True)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def fetch_entry_media(
+        self,
+        entry: feedparser.FeedParserDict,
+        audio: bool = True,
+        image: bool = True,
+    ) -> EntryMedia:
+        media = EntryMedia()
+        try:
+            if image and (image_url := get_entry_image_url(entry)):
+                logger.info("Fetching episode image: %s", image_url)
+                media.image = self.get(image_url, IMAGE_TIMEOUT)
+                if media.image is None:
+                    media.failed_urls.append(image_url)
+            if audio and (audio_url := get_entry_audio_url(entry)):
+                logger.info("Fetching audio file: %s", audio_url)
+                media.audio = self.get(audio_url, AUDIO_TIMEOUT)
+                if media.audio is None:
+                    media.failed_urls.append(audio_url)
+        except BaseException:
+            media.close()
+            raise
+        return media
+
+    def get(self, url: str, timeout: float) -> DownloadedFile | None:
+        """
+        Streams `url` to a temporary file. Returns None if the server
+        responds with an error status.
+        """
+        file = tempfile.NamedTemporaryFile()
+        try:
+            downloaded = self.download(url, timeout, file)
+        except BaseException:
+            file.close()
+            raise
+        if downloaded is None:
+            file.close()
+        return downloaded
+
+    def download(self, url: str, timeout: float, file: IO[bytes]) -> DownloadedFile | None:
+        """
+        If the connection breaks, the download is resumed from where it
+        stopped, up to MAX_RESUMES times. If-Range makes sure we get the
+        whole file again if it has changed in the meantime.
+        """
+        # Compressed transfers would make Range offsets differ from ours.
+        headers = {"Accept-Encoding": "identity"}
+        hasher = hashlib.sha256()
+        content_type = ""
+        length = 0
+        resumes = 0
+        accepts_ranges = False
+        validator: str | None = None
+
+        while True:
+            response = self.session.get(url, headers=headers, stream=True, timeout=timeout)
+
+            with response:
+                if response.status_code == 206 and "Range" in headers:
+                    if get_range_start(response) != length:
+                        logger.warning("Unexpected Content-Range from %s, giving up", url)
+                        return None
+                elif response.ok and response.status_code != 206:
+                    if length:
+                        # The server ignored our Range header or the file has
+                        # changed, so start over.
+                        file.seek(0)
+                        file.truncate()
+                        hasher = hashlib.sha256()
+                        length = 0
+                    content_type = response.headers.get("Content-Type", "")
+                    accepts_ranges = response.headers.get("Accept-Ranges") == "bytes"
+                    validator = response.headers.get("ETag") or response.headers.get("Last-Modified")
+                else:
+                    logger.warning("Could not fetch %s: %s", url, response.status_code)
+                    return None
+
+                try:
+                    for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        file.write(chunk)
+                        hasher.update(chunk)
+                        length += len(chunk)
+                except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                    if not accepts_ranges or resumes >= MAX_RESUMES:
+                        raise
+                    resumes += 1
+                    logger.info("Download of %s interrupted at %d bytes (%s), resuming", url, length, e)
+                    headers["Range"] = f"bytes={length}-"
+                    if validator:
+                        headers["If-Range"] = validator
+                    continue
+
+            break
+
+        file.flush()
+        file.seek(0)
+        sha256 = hasher.hexdigest()
+        logger.debug("Downloaded %s: %d bytes, SHA-256 %s", url, length, sha256)
+
+        return DownloadedFile(content_type=content_type, file=file, length=length, sha256=sha256, url=url)
+
+
+def get_entry_audio_url(entry: feedparser.FeedParserDict) -> str | None:
+    if "links" in entry:
+        link = getitem0_nullable(entry.links, lambda l: l.get("rel", "") == "enclosure")
+        if link and "href" in link:
+            return link.href
+    return None
+
+
+def get_entry_guid(entry: feedparser.FeedParserDict) -> str:
+    """The entry's <guid>, or failing that its enclosure URL."""
+    return entry.get("id") or get_entry_audio_url(entry) or ""
+
+
+def get_entry_image_url(entry: feedparser.FeedParserDict) -> str | None:
+    if "image" in entry and "href" in entry.image and entry.image.href:
+        return entry.image.href
+    return None
+
+
+def get_feed_hash(data: feedparser.FeedParserDict) -> str:
+    """SHA-256 of the parsed contents of a feed entry or channel."""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def get_range_start(response: requests.Response) -> int | None:
+    # Content-Range: bytes 1000-4999/5000
+    unit, _, value = response.headers.get("Content-Range", "").partition(" ")
+    start = value.partition("-")[0]
+    if unit != "bytes" or not start.isdigit():
+        return None
+    return int(start)
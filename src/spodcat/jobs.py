@@ -0,0 +1,175 @@
+"""
+Task registry and worker for the database backed job queue (see
+spodcat.models.Job). Production setups should run the `run_jobs` management
+command; with RUN_JOBS_IN_PROCESS, a worker thread is started in the web
+process whenever a job is queued.
+"""
+import datetime
+import logging
+import threading
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from typing import TYPE_CHECKING, Callable
+
+from django.db import close_old_connections, connection
+
+from spodcat.settings import spodcat_settings
+
+
+if TYPE_CHECKING:
+    from spodcat.models import Job
+
+
+logger = logging.getLogger(__name__)
+
+TASKS: "dict[str, Callable[[Job], None]]" = {}
+
+_in_process_lock = threading.Lock()
+_in_process_thread: threading.Thread | None = None
+
+
+class Worker:
+    """
+    Claims and runs jobs, with at most `max_workers` of them running at the
+    same time.
+    """
+    def __init__(self, max_workers: int | None = None, poll_interval: float = 5.0):
+        self.max_workers = max_workers or spodcat_settings.JOB_WORKERS
+        self.poll_interval = poll_interval
+
+    def run(self, until_empty: bool = False):
+        """
+        With `until_empty`, returns when there are no more queued jobs
+        (including ones waiting for a retry); otherwise runs forever.
+        """
+        from spodcat.models import Job, JobStatus
+
+        Job.objects.requeue_stale(datetime.timedelta(seconds=spodcat_settings.JOB_TIMEOUT))
+        futures: set[Future] = set()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                while len(futures) < self.max_workers:
+                    job = Job.claim()
+                    if job is None:
+                        break
+                    logger.info("Running job %s", job)
+                    futures.add(executor.submit(run_job, job))
+
+                if not futures:
+                    if until_empty and not Job.objects.filter(status=JobStatus.QUEUED).exists():
+                        return
+                    time.sleep(self.poll_interval)
+                    continue
+
+                _, futures = wait(futures, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+
+
+def get_task(name: str) -> "Callable[[Job], None]":
+    try:
+        return TASKS[name]
+    except KeyError as e:
+        raise ValueError(f"Unknown job task: {name}") from e
+
+
+def run_job(job: "Job"):
+    try:
+        job.run()
+    finally:
+        # Each pool thread has its own connection.
+        connection.close()
+
+
+def start_in_process_worker():
+    """
+    Starts a worker thread that runs until the queue is empty, unless
+    RUN_JOBS_IN_PROCESS is off or one is already running.
+    """
+    global _in_process_thread
+
+    if not spodcat_settings.RUN_JOBS_IN_PROCESS:
+        return
+
+    with _in_process_lock:
+        if _in_process_thread and _in_process_thread.is_alive():
+            return
+        _in_process_thread = threading.Thread(target=_run_in_process_worker, daemon=True)
+        _in_process_thread.start()
+
+
+def task(name: str):
+    """Decorator that registers a function as a job task."""
+    def decorator(func: "Callable[[Job], None]"):
+        TASKS[name] = func
+        return func
+    return decorator
+
+
+def _run_in_process_worker():
+    global _in_process_thread
+
+    from spodcat.models import Job, JobStatus
+
+    try:
+        while True:
+            Worker().run(until_empty=True)
+            # Jobs queued after the worker found the queue empty, but before
+            # this thread was reset, would otherwise be left waiting.
+            with _in_process_lock:
+                if not Job.objects.filter(status=JobStatus.QUEUED).exists():
+                    _in_process_thread = None
+                    return
+    except Exception as e:
+        logger.error("In-process job worker crashed", exc_info=e)
+        with _in_process_lock:
+            _in_process_thread = None
+    finally:
+        close_old_connections()
+        connection.close()
+
+
+@task("episode_audio_data")
+def episode_audio_data(job: "Job"):
+    """Duration and dBFS array for an episode's audio file."""
+    episode = job.episode
+    if episode and episode.audio_file:
+        episode.get_dbfs_and_duration()
+
+
+@task("episode_renditions")
+def episode_renditions(job: "Job"):
+    episode = job.episode
+    if episode and episode.audio_file:
+        episode.generate_renditions()
+
+
+@task("episode_image_thumbnail")
+def episode_image_thumbnail(job: "Job"):
+    episode = job.episode
+    if episode:
+        episode.handle_uploaded_image()
+        # Only the image fields, so concurrent jobs for the same episode
+        # don't overwrite each other's results.
+        episode.save(update_fields=[
+            "image_height",
+            "image_mimetype",
+            "image_thumbnail",
+            "image_thumbnail_height",
+            "image_thumbnail_mimetype",
+            "image_thumbnail_width",
+            "image_width",
+        ])
+
+
+@task("gc_media_blobs")
+def gc_media_blobs(job: "Job"):
+    from spodcat.models import MediaBlob
+
+    deleted = MediaBlob.collect_garbage()
+    if deleted:
+        logger.info("Deleted %d unreferenced media blobs", deleted)
@@ -7,6 +7,7 @@ from spodcat.contrib.admin.mixin import AdminMixin
 from spodcat.contrib.admin.widgets import ReadOnlyInlineModelWidget
 from spodcat.logs.models import (
     GeoIP,
+    ListeningSession,
     PodcastContentRequestLog,
     PodcastEpisodeAudioRequestLog,
     PodcastRequestLog,
@@ -40,6 +41,10 @@ class LogAdminForm(ModelForm):
     user_agent_data = ModelChoiceField(queryset=UserAgent.objects.all(), widget=UserAgentWidget())
 
 
+class ListeningSessionAdminForm(ModelForm):
+    user_agent_data = ModelChoiceField(queryset=UserAgent.objects.all(), widget=UserAgentWidget())
+
+
 class LogAdmin(AdminMixin, admin.ModelAdmin):
     form = LogAdminForm
     ordering = ["-created"]
@@ -53,11 +58,11 @@ class LogAdmin(AdminMixin, admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         return False
 
-    @admin.display(ordering=Coalesce("user_agent_data__name", "user_agent"), description=_("user agent name"))
-    def user_agent_name(self, obj: RequestLog):
+    @admin.display(ordering=Coalesce("user_agent_data__name", "user_agent__value"), description=_("user agent name"))
+    def user_agent_name(self, obj: RequestLog | ListeningSession):
         if obj.user_agent_data:
             return obj.user_agent_data.name
-        return obj.user_agent
+        return obj.user_agent.value if obj.user_agent else ""
 
 
 @admin.register(PodcastRequestLog)
@@ -78,7 +83,7 @@ class PodcastRequestLogAdmin(LogAdmin):
     ]
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related("podcast", "user_agent_data")
+        return super().get_queryset(request).select_related("podcast", "user_agent", "user_agent_data")
 
     @admin.display(description=_("podcast"), ordering="podcast__name")
     def podcast_link(self, obj: PodcastRequestLog):
@@ -109,7 +114,7 @@ class PodcastContentRequestLogAdmin(LogAdmin):
         return self.get_change_link(obj.content)
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related("content__podcast", "user_agent_data")
+        return super().get_queryset(request).select_related("content__podcast", "user_agent", "user_agent_data")
 
     @admin.display(description=_("podcast"), ordering="content__podcast__name")
     def podcast_link(self, obj: PodcastContentRequestLog):
@@ -145,7 +150,7 @@ class PodcastEpisodeAudioRequestLogAdmin(LogAdmin):
     def get_queryset(self, request):
         return (
             super().get_queryset(request)
-            .select_related("episode__podcast", "user_agent_data")
+            .select_related("episode__podcast", "user_agent", "user_agent_data")
             .with_percent_fetched()
         )
 
@@ -158,3 +163,46 @@ class PodcastEpisodeAudioRequestLogAdmin(LogAdmin):
         if obj.episode:
             return self.get_change_link(obj.episode.podcast)
         return None
+
+
+@admin.register(ListeningSession)
+class ListeningSessionAdmin(LogAdmin):
+    form = ListeningSessionAdminForm
+    list_display = [
+        "start",
+        "episode_link",
+        "podcast_link",
+        "remote_addr",
+        "user_agent_name",
+        "user_agent_data__type",
+        "request_count",
+        "percent_covered",
+        "is_bot",
+    ]
+    list_filter = [
+        "start",
+        ("episode__podcast", admin.RelatedOnlyFieldListFilter),
+        "is_bot",
+        "user_agent_data__type",
+        ("episode", admin.RelatedOnlyFieldListFilter),
+    ]
+    ordering = ["-start"]
+
+    @admin.display(description=_("episode"), ordering="episode__name")
+    def episode_link(self, obj: ListeningSession):
+        return self.get_change_link(obj.episode)
+
+    def get_queryset(self, request):
+        return (
+            super().get_queryset(request)
+            .select_related("episode__podcast", "user_agent", "user_agent_data")
+            .with_percent_covered()
+        )
+
+    @admin.display(description=_("% covered"), ordering="percent_covered")
+    def percent_covered(self, obj):
+        return round(obj.percent_covered, 2)
+
+    @admin.display(description=_("podcast"), ordering="episode__podcast__name")
+    def podcast_link(self, obj: ListeningSession):
+        return self.get_change_link(obj.episode.podcast)
@@ -1,3 +1,4 @@
+import functools
 import ipaddress
 import logging
 from pathlib import Path
@@ -64,6 +65,7 @@ def get_geoip2_city(ip: str) -> geoip2.models.City | None:
         return None
 
 
+@functools.lru_cache(maxsize=2000)
 def get_ip_address_category(ip: str | None) -> IpAddressCategory:
     if not ip:
         return IpAddressCategory.UNKNOWN
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+
+from spodcat.logs.models import ListeningSession
+from spodcat.logs.sessions import SESSION_GAP
+
+
+class Command(BaseCommand):
+    help = "Groups episode audio request logs into listening sessions. Run it regularly, e.g. by cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--gap",
+            type=int,
+            default=int(SESSION_GAP.total_seconds() / 60),
+            help="Max number of minutes between two requests in the same session.",
+        )
+
+    def handle(self, *args, **options):
+        processed = ListeningSession.build(gap=timedelta(minutes=options["gap"]))
+        self.stdout.write(f"{processed} audio request log(s) assigned to listening sessions.")
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from spodcat.logs.models import PodcastRssRequestLog
+
+
+class Command(BaseCommand):
+    help = "Collapses RSS request logs older than N days into hourly per-IP and user agent counter rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=30, help="Compact logs older than this many days.")
+        parser.add_argument("--chunk-hours", type=int, default=24, help="Number of hours to process per transaction.")
+
+    def handle(self, *args, **options):
+        older_than = timezone.now() - timedelta(days=options["days"])
+        total = 0
+
+        for chunk_start, deleted in PodcastRssRequestLog.compact(
+            older_than=older_than,
+            chunk_size=timedelta(hours=options["chunk_hours"]),
+        ):
+            total += deleted
+            self.stdout.write(f"{chunk_start}: {deleted} row(s) compacted ({total} in total)")
+
+        self.stdout.write(f"Done. {total} row(s) compacted.")
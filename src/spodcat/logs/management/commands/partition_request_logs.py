@@ -0,0 +1,47 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import connections
+
+from spodcat.logs.partitioning import (
+    convert_table,
+    get_log_models,
+    is_partitioned,
+    maintain_partitions,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates upcoming monthly partitions for partitioned request log tables, and archives partitions older "
+        "than LOG_RETENTION_MONTHS. Use --convert once to convert the tables to partitioned ones. PostgreSQL only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default="default")
+        parser.add_argument("--convert", action="store_true", help="Convert unpartitioned log tables first.")
+        parser.add_argument("--no-archive", action="store_true", help="Only create partitions, don't archive.")
+
+    def handle(self, *args, **options):
+        using = options["database"]
+
+        if connections[using].vendor != "postgresql":
+            raise CommandError("Partitioned request log tables are only supported on PostgreSQL.")
+
+        if options["convert"]:
+            for model in get_log_models():
+                table = model._meta.db_table
+                if is_partitioned(table, using):
+                    self.stdout.write(f"{table} is already partitioned.")
+                else:
+                    self.stdout.write(f"Converting {table} ...")
+                    convert_table(table, using)
+
+        result = maintain_partitions(using=using, archive=not options["no_archive"])
+
+        if not result:
+            self.stdout.write("No partitioned request log tables found. Run with --convert to convert them.")
+
+        for table, changes in result.items():
+            for name in changes["created"]:
+                self.stdout.write(f"{table}: created partition {name}")
+            for name in changes["archived"]:
+                self.stdout.write(f"{table}: archived partition to {name}")
@@ -0,0 +1,53 @@
+from django.core.management import BaseCommand
+from django.db.models import Sum
+
+from spodcat.logs.models import (
+    ListeningSession,
+    PodcastContentRequestLog,
+    PodcastEpisodeAudioRequestLog,
+    PodcastRequestLog,
+    PodcastRssRequestLog,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Reruns bot and user agent classification on all request logs and listening sessions. Run it after updating "
+        "the GoodBots or user-agents-v2 submodules."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Max number of rows per UPDATE query.")
+
+    def get_stats(self) -> dict[str, float]:
+        sessions = ListeningSession.objects.filter(is_bot=False)
+
+        return {
+            "plays": sessions.aggregate(plays=Sum("covered_fraction"))["plays"] or 0.0,
+            "players": sessions.filter(bytes_covered__gt=0).values("remote_addr").distinct().count(),
+            "views": (
+                PodcastRequestLog.objects.filter(is_bot=False).count() +
+                PodcastContentRequestLog.objects.filter(is_bot=False).count()
+            ),
+        }
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        user_agents = {}
+        before = self.get_stats()
+
+        for model in (
+            PodcastRequestLog,
+            PodcastContentRequestLog,
+            PodcastEpisodeAudioRequestLog,
+            PodcastRssRequestLog,
+            ListeningSession,
+        ):
+            updated = model.reclassify(chunk_size=chunk_size, user_agents=user_agents)
+            self.stdout.write(f"{model._meta.verbose_name_plural}: {updated} row(s) updated.")
+
+        after = self.get_stats()
+
+        self.stdout.write(f"Plays: {before['plays']:.1f} -> {after['plays']:.1f}")
+        self.stdout.write(f"Players: {before['players']} -> {after['players']}")
+        self.stdout.write(f"Views: {before['views']} -> {after['views']}")
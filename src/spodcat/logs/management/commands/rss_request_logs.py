@@ -13,11 +13,12 @@ class Command(BaseCommand):
         for path_info, logs in itertools.groupby(
             PodcastRssRequestLog.objects
             .using(options["database"])
-            .order_by("path_info", "created"),
+            .select_related("path_info", "referrer")
+            .order_by("path_info__value", "created"),
             key=lambda l: l.path_info,
         ):
             logs = list(logs)
-            requests = len(logs)
+            requests = sum(l.request_count for l in logs)
             delta = logs[-1].created - logs[0].created
             if not delta:
                 continue
@@ -29,7 +30,7 @@ class Command(BaseCommand):
                 for r in set(l.referrer for l in logs) if r
             }
 
-            self.stdout.write(path_info)
+            self.stdout.write(str(path_info or ""))
             self.stdout.write(f"Total requests: {requests}")
             self.stdout.write(f"Requests/day: {(requests / days):.02f}")
             self.stdout.write(f"Requests/hour: {(requests / hours):.02f}")
@@ -39,9 +40,10 @@ class Command(BaseCommand):
                 self.stdout.write("Referrers:")
                 for ref, ref_logs in referrers.items():
                     ref_uq_ips = set(l.remote_addr for l in ref_logs)
-                    ref_percent = len(ref_logs) / len(logs) * 100
+                    ref_requests = sum(l.request_count for l in ref_logs)
+                    ref_percent = ref_requests / requests * 100
                     self.stdout.write(
-                        f" * {ref}: {len(ref_logs)} / {ref_percent:.02f}% ({len(ref_uq_ips)} unique IPs)"
+                        f" * {ref}: {ref_requests} / {ref_percent:.02f}% ({len(ref_uq_ips)} unique IPs)"
                     )
 
             self.stdout.write("")
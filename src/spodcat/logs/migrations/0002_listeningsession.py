@@ -0,0 +1,48 @@
+# Generated by Django 5.2.3 on 2026-10-19 14:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import spodcat.model_mixin
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spodcat', '0001_initial'),
+        ('spodcat_logs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListeningSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bytes_covered', models.BigIntegerField(default=0, verbose_name='bytes covered')),
+                ('covered_fraction', models.FloatField(db_index=True, default=0.0, verbose_name='covered fraction')),
+                ('end', models.DateTimeField(verbose_name='end')),
+                ('is_bot', models.BooleanField(db_index=True, default=False, verbose_name='is bot')),
+                ('remote_addr', models.GenericIPAddressField(db_index=True, default=None, null=True, verbose_name='remote address')),
+                ('request_count', models.PositiveIntegerField(default=0, verbose_name='request count')),
+                ('start', models.DateTimeField(db_index=True, verbose_name='start')),
+                ('user_agent', models.CharField(blank=True, default='', max_length=400, verbose_name='user agent')),
+                ('episode', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='listening_sessions', to='spodcat.episode', verbose_name='episode')),
+                ('user_agent_data', models.ForeignKey(default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='spodcat_logs.useragent', verbose_name='user agent data')),
+            ],
+            options={
+                'verbose_name': 'listening session',
+                'verbose_name_plural': 'listening sessions',
+            },
+            bases=(spodcat.model_mixin.ModelMixin, models.Model),
+        ),
+        migrations.AddField(
+            model_name='podcastepisodeaudiorequestlog',
+            name='range_start',
+            field=models.BigIntegerField(blank=True, default=None, null=True, verbose_name='range start'),
+        ),
+        migrations.AddField(
+            model_name='podcastepisodeaudiorequestlog',
+            name='session',
+            field=models.ForeignKey(default=None, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='requests', to='spodcat_logs.listeningsession', verbose_name='listening session'),
+        ),
+    ]
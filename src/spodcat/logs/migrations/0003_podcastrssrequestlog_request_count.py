@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spodcat_logs', '0002_listeningsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='podcastrssrequestlog',
+            name='request_count',
+            field=models.PositiveIntegerField(default=1, verbose_name='request count'),
+        ),
+    ]
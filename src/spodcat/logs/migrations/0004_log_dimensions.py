@@ -0,0 +1,137 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+CHUNK_SIZE = 10_000
+
+# (field name, dimension model name)
+DIMENSIONS = [
+    ('path_info', 'logpath'),
+    ('referrer', 'logreferrer'),
+    ('remote_host', 'logremotehost'),
+    ('user_agent', 'loguseragent'),
+]
+
+LOG_MODELS = [
+    'podcastcontentrequestlog',
+    'podcastepisodeaudiorequestlog',
+    'podcastrequestlog',
+    'podcastrssrequestlog',
+]
+
+# (model name, field name, dimension model name)
+FIELDS = [
+    *((model_name, field_name, dimension) for model_name in LOG_MODELS for field_name, dimension in DIMENSIONS),
+    ('listeningsession', 'user_agent', 'loguseragent'),
+]
+
+
+def iterate_pk_ranges(model):
+    pks = model.objects.aggregate(min_pk=models.Min('pk'), max_pk=models.Max('pk'))
+    if pks['min_pk'] is None:
+        return
+    for start in range(pks['min_pk'], pks['max_pk'] + 1, CHUNK_SIZE):
+        yield start, start + CHUNK_SIZE - 1
+
+
+def fill_dimensions(apps, schema_editor):
+    for model_name, field_name, dimension_name in FIELDS:
+        model = apps.get_model('spodcat_logs', model_name)
+        dimension = apps.get_model('spodcat_logs', dimension_name)
+        values = model.objects.exclude(**{field_name: ''}).order_by().values_list(field_name, flat=True).distinct()
+        dimension.objects.bulk_create(
+            [dimension(value=value) for value in values.iterator()],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+        for start, end in iterate_pk_ranges(model):
+            model.objects.filter(pk__range=(start, end)).update(**{
+                f'{field_name}_ref': Subquery(
+                    dimension.objects.filter(value=OuterRef(field_name)).values('pk')[:1]
+                ),
+            })
+
+
+def empty_dimensions(apps, schema_editor):
+    for model_name, field_name, dimension_name in FIELDS:
+        model = apps.get_model('spodcat_logs', model_name)
+        dimension = apps.get_model('spodcat_logs', dimension_name)
+
+        for start, end in iterate_pk_ranges(model):
+            model.objects.filter(pk__range=(start, end)).update(**{
+                field_name: Coalesce(
+                    Subquery(dimension.objects.filter(pk=OuterRef(f'{field_name}_ref')).values('value')[:1]),
+                    models.Value(''),
+                ),
+            })
+
+
+def dimension_model(name, max_length, verbose_name, verbose_name_plural, value_verbose_name=None):
+    return migrations.CreateModel(
+        name=name,
+        fields=[
+            ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ('value', models.CharField(max_length=max_length, unique=True, verbose_name=value_verbose_name or verbose_name)),
+        ],
+        options={
+            'verbose_name': verbose_name,
+            'verbose_name_plural': verbose_name_plural,
+        },
+    )
+
+
+def dimension_field(dimension_name, verbose_name):
+    return models.ForeignKey(
+        db_index=False,
+        default=None,
+        null=True,
+        on_delete=django.db.models.deletion.PROTECT,
+        related_name='+',
+        to=f'spodcat_logs.{dimension_name}',
+        verbose_name=verbose_name,
+    )
+
+
+VERBOSE_NAMES = {
+    'path_info': 'path',
+    'referrer': 'referrer',
+    'remote_host': 'remote host',
+    'user_agent': 'user agent',
+}
+
+
+class Migration(migrations.Migration):
+    # Lets the backfill commit chunk by chunk, and avoids "pending trigger
+    # events" errors on PostgreSQL when dropping columns after the updates.
+    atomic = False
+
+    dependencies = [
+        ('spodcat_logs', '0003_podcastrssrequestlog_request_count'),
+    ]
+
+    operations = [
+        dimension_model('LogPath', 200, 'path', 'paths'),
+        dimension_model('LogReferrer', 150, 'referrer', 'referrers'),
+        dimension_model('LogRemoteHost', 100, 'remote host', 'remote hosts'),
+        dimension_model('LogUserAgent', 400, 'user agent string', 'user agent strings', 'user agent'),
+        *(
+            migrations.AddField(
+                model_name=model_name,
+                name=f'{field_name}_ref',
+                field=dimension_field(dimension_name, VERBOSE_NAMES[field_name]),
+            )
+            for model_name, field_name, dimension_name in FIELDS
+        ),
+        migrations.RunPython(fill_dimensions, empty_dimensions, elidable=True),
+        *(
+            migrations.RemoveField(model_name=model_name, name=field_name)
+            for model_name, field_name, _ in FIELDS
+        ),
+        *(
+            migrations.RenameField(model_name=model_name, old_name=f'{field_name}_ref', new_name=field_name)
+            for model_name, field_name, _ in FIELDS
+        ),
+    ]
@@ -1,14 +1,15 @@
 import datetime
 import ipaddress
+import itertools
 import logging
 import socket
 from typing import TYPE_CHECKING
 
-from django.db import models
-from django.db.models import F, Q
+from django.db import models, transaction
+from django.db.models import Count, F, Min, Q, Sum
+from django.db.models.functions import Trunc
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from klaatu_django.db import TruncatedCharField
 from rest_framework.request import Request
 
 from spodcat.logs.ip_check import (
@@ -18,9 +19,11 @@ from spodcat.logs.ip_check import (
     get_ip_address_category,
 )
 from spodcat.logs.querysets import (
+    ListeningSessionQuerySet,
     PodcastEpisodeAudioRequestLogQuerySet,
     PodcastRssRequestLogQuerySet,
 )
+from spodcat.logs.sessions import SESSION_GAP, group_sessions
 from spodcat.logs.user_agent import (
     DeviceCategory,
     UserAgentData,
@@ -29,10 +32,12 @@ from spodcat.logs.user_agent import (
     get_useragent_data,
 )
 from spodcat.model_mixin import ModelMixin
+from spodcat.utils import update_in_chunks
 
 
 if TYPE_CHECKING:
     from spodcat.logs.querysets import (
+        ListeningSessionManager,
         PodcastEpisodeAudioRequestLogManager,
         PodcastRssRequestLogManager,
     )
@@ -42,11 +47,100 @@ if TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 
+def classify_request(
+    user_agent: str,
+    remote_addr: str | None,
+    user_agents: "dict[str, UserAgent | None]",
+) -> "tuple[bool, IpAddressCategory, UserAgent | None]":
+    """
+    Returns is_bot, remote address category and UserAgent object, using (and
+    filling) `user_agents` as a cache of UserAgent objects by string.
+    """
+    ua_data = get_useragent_data(user_agent)
+    remote_addr_category = get_ip_address_category(remote_addr)
+
+    if user_agent not in user_agents:
+        user_agents[user_agent] = UserAgent.update_or_create(ua_data) if ua_data else None
+
+    is_bot = bool(ua_data and ua_data.is_bot) or remote_addr_category.is_bot
+    return is_bot, remote_addr_category, user_agents[user_agent]
+
+
 class ReferrerCategory(models.TextChoices):
     APP = "app"
     HOST = "host"
 
 
+class LogDimension(ModelMixin, models.Model):
+    """
+    Holds the distinct values of a request log column, so the log rows only
+    have to store an integer key. Empty values are stored as NULL keys on
+    the log rows and have no dimension row.
+    """
+    value: str
+
+    _cache: "dict[str, LogDimension]"
+
+    class Meta:
+        abstract = True
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._cache = {}
+
+    def __str__(self):
+        return self.value
+
+    @classmethod
+    def get_for_value(cls, value: str | None):
+        if not value:
+            return None
+
+        value = value[:cls._meta.get_field("value").max_length]
+        obj = cls._cache.get(value)
+
+        if obj is None:
+            obj, _ = cls.objects.get_or_create(value=value)
+            if len(cls._cache) >= 10_000:
+                cls._cache.clear()
+            # Don't cache rows that could still be rolled back:
+            transaction.on_commit(lambda: cls._cache.setdefault(value, obj))
+
+        return obj
+
+
+class LogPath(LogDimension):
+    value = models.CharField(max_length=200, unique=True, verbose_name=_("path"))
+
+    class Meta:
+        verbose_name = _("path")
+        verbose_name_plural = _("paths")
+
+
+class LogReferrer(LogDimension):
+    value = models.CharField(max_length=150, unique=True, verbose_name=_("referrer"))
+
+    class Meta:
+        verbose_name = _("referrer")
+        verbose_name_plural = _("referrers")
+
+
+class LogRemoteHost(LogDimension):
+    value = models.CharField(max_length=100, unique=True, verbose_name=_("remote host"))
+
+    class Meta:
+        verbose_name = _("remote host")
+        verbose_name_plural = _("remote hosts")
+
+
+class LogUserAgent(LogDimension):
+    value = models.CharField(max_length=400, unique=True, verbose_name=_("user agent"))
+
+    class Meta:
+        verbose_name = _("user agent string")
+        verbose_name_plural = _("user agent strings")
+
+
 class UserAgent(ModelMixin, models.Model):
     device_category = models.CharField(
         max_length=20,
@@ -80,6 +174,22 @@ class UserAgent(ModelMixin, models.Model):
                 obj.save()
             return obj
 
+    @classmethod
+    def update_or_create(cls, data: UserAgentData):
+        obj = cls.get_or_create(data, save=False)
+        values = {
+            "device_category": data.device_category,
+            "device_name": data.device_name,
+            "name": data.name,
+            "type": data.type,
+        }
+
+        if obj._state.adding or any(getattr(obj, key) != value for key, value in values.items()):
+            for key, value in values.items():
+                setattr(obj, key, value)
+            obj.save()
+        return obj
+
 
 class GeoIP(ModelMixin, models.Model):
     city = models.CharField(max_length=100, verbose_name=_("city"))
@@ -125,8 +235,24 @@ class RequestLog(ModelMixin, models.Model):
         verbose_name=_("GeoIP"),
     )
     is_bot = models.BooleanField(default=False, db_index=True, verbose_name=_("is bot"))
-    path_info = TruncatedCharField(max_length=200, blank=True, default="", verbose_name=_("path"))
-    referrer = TruncatedCharField(max_length=150, blank=True, default="", verbose_name=_("referrer"))
+    path_info: "LogPath | None" = models.ForeignKey(
+        "spodcat_logs.LogPath",
+        on_delete=models.PROTECT,
+        null=True,
+        default=None,
+        db_index=False,
+        related_name="+",
+        verbose_name=_("path"),
+    )
+    referrer: "LogReferrer | None" = models.ForeignKey(
+        "spodcat_logs.LogReferrer",
+        on_delete=models.PROTECT,
+        null=True,
+        default=None,
+        db_index=False,
+        related_name="+",
+        verbose_name=_("referrer"),
+    )
     referrer_category = models.CharField(
         max_length=10,
         null=True,
@@ -147,8 +273,24 @@ class RequestLog(ModelMixin, models.Model):
         default=IpAddressCategory.UNKNOWN,
         verbose_name=_("remote address category"),
     )
-    remote_host = models.CharField(max_length=100, blank=True, default="", verbose_name=_("remote host"))
-    user_agent = models.CharField(max_length=400, blank=True, default="", verbose_name=_("user agent"))
+    remote_host: "LogRemoteHost | None" = models.ForeignKey(
+        "spodcat_logs.LogRemoteHost",
+        on_delete=models.PROTECT,
+        null=True,
+        default=None,
+        db_index=False,
+        related_name="+",
+        verbose_name=_("remote host"),
+    )
+    user_agent: "LogUserAgent | None" = models.ForeignKey(
+        "spodcat_logs.LogUserAgent",
+        on_delete=models.PROTECT,
+        null=True,
+        default=None,
+        db_index=False,
+        related_name="+",
+        verbose_name=_("user agent"),
+    )
     user_agent_data: "UserAgent | None" = models.ForeignKey(
         "spodcat_logs.UserAgent",
         on_delete=models.SET_NULL,
@@ -171,6 +313,7 @@ class RequestLog(ModelMixin, models.Model):
         referrer: str | None = None,
         save: bool = True,
         created: datetime.datetime | None = None,
+        path_info: str | None = None,
         **kwargs,
     ):
         user_agent = user_agent or ""
@@ -188,14 +331,15 @@ class RequestLog(ModelMixin, models.Model):
 
         obj = cls(
             is_bot=(ua_data and ua_data.is_bot) or remote_addr_category.is_bot,
-            referrer=referrer,
+            path_info=LogPath.get_for_value(path_info),
+            referrer=LogReferrer.get_for_value(referrer),
             referrer_category=ReferrerCategory(ref_dict["category"]) if ref_dict else None,
             referrer_name=ref_dict["name"] if ref_dict else "",
             remote_addr=remote_addr,
             remote_addr_category=remote_addr_category,
-            remote_host=remote_host if remote_host != remote_addr else "",
+            remote_host=LogRemoteHost.get_for_value(remote_host if remote_host != remote_addr else ""),
             user_agent_data=user_agent_obj,
-            user_agent=user_agent,
+            user_agent=LogUserAgent.get_for_value(user_agent),
             geoip=geoip,
             created=created,
             **kwargs,
@@ -237,7 +381,7 @@ class RequestLog(ModelMixin, models.Model):
     def fill_remote_hosts(cls):
         ips = list(
             cls.objects
-            .filter(Q(remote_host="") | Q(remote_addr__startswith=F("remote_host")))
+            .filter(Q(remote_host=None) | Q(remote_addr__startswith=F("remote_host__value")))
             .exclude(remote_addr=None)
             .order_by()
             .values_list("remote_addr", flat=True)
@@ -248,7 +392,39 @@ class RequestLog(ModelMixin, models.Model):
             remote_host = socket.getfqdn(ip)
             if remote_host != ip:
                 logger.info("(%d/%d) %s: %s", idx + 1, len(ips), ip, remote_host)
-                cls.objects.filter(remote_addr=ip).update(remote_host=remote_host)
+                cls.objects.filter(remote_addr=ip).update(remote_host=LogRemoteHost.get_for_value(remote_host))
+
+    @classmethod
+    def reclassify(cls, chunk_size: int = 1000, user_agents: "dict[str, UserAgent | None] | None" = None) -> int:
+        """
+        Reruns bot, user agent and IP classification on all logs, e.g. after
+        the GoodBots or user-agents-v2 submodules have been updated. Each
+        distinct user agent/IP pair is only classified once. Returns the
+        number of updated logs.
+        """
+        user_agents = {} if user_agents is None else user_agents
+        pairs = list(
+            cls.objects.order_by().values_list("user_agent", "user_agent__value", "remote_addr").distinct()
+        )
+        updated = 0
+
+        for idx, (user_agent_id, user_agent, remote_addr) in enumerate(pairs):
+            user_agent = user_agent or ""
+            is_bot, remote_addr_category, user_agent_obj = classify_request(user_agent, remote_addr, user_agents)
+            count = update_in_chunks(
+                cls.objects
+                .filter(user_agent=user_agent_id, remote_addr=remote_addr)
+                .exclude(is_bot=is_bot, remote_addr_category=remote_addr_category, user_agent_data=user_agent_obj),
+                chunk_size=chunk_size,
+                is_bot=is_bot,
+                remote_addr_category=remote_addr_category,
+                user_agent_data=user_agent_obj,
+            )
+            if count:
+                logger.info("(%d/%d) %s, %s: %d log(s) updated", idx + 1, len(pairs), remote_addr, user_agent, count)
+            updated += count
+
+        return updated
 
     def has_change_permission(self, request):
         return False
@@ -288,7 +464,16 @@ class PodcastEpisodeAudioRequestLog(RequestLog):
         related_name="audio_requests",
         verbose_name=_("episode"),
     )
+    range_start = models.BigIntegerField(null=True, default=None, blank=True, verbose_name=_("range start"))
     response_body_size = models.IntegerField(db_index=True, verbose_name=_("response body size"))
+    session: "ListeningSession | None" = models.ForeignKey(
+        "spodcat_logs.ListeningSession",
+        on_delete=models.SET_NULL,
+        null=True,
+        default=None,
+        related_name="requests",
+        verbose_name=_("listening session"),
+    )
     status_code = models.CharField(max_length=10, verbose_name=_("status code"))
 
     objects: "PodcastEpisodeAudioRequestLogManager" = PodcastEpisodeAudioRequestLogQuerySet.as_manager()
@@ -339,6 +524,158 @@ class PodcastEpisodeAudioRequestLog(RequestLog):
         )
 
 
+class ListeningSession(ModelMixin, models.Model):
+    """
+    One continuous listening session, reconstructed from the audio request
+    logs sharing episode, IP and user agent, where no two consecutive
+    requests are more than SESSION_GAP apart. Byte ranges of the requests
+    are merged, so overlapping range requests are only counted once.
+    """
+    bytes_covered = models.BigIntegerField(default=0, verbose_name=_("bytes covered"))
+    covered_fraction = models.FloatField(default=0.0, db_index=True, verbose_name=_("covered fraction"))
+    end = models.DateTimeField(verbose_name=_("end"))
+    episode: "Episode" = models.ForeignKey(
+        "spodcat.Episode",
+        on_delete=models.CASCADE,
+        related_name="listening_sessions",
+        verbose_name=_("episode"),
+    )
+    is_bot = models.BooleanField(default=False, db_index=True, verbose_name=_("is bot"))
+    remote_addr = models.GenericIPAddressField(
+        null=True,
+        db_index=True,
+        default=None,
+        verbose_name=_("remote address"),
+    )
+    request_count = models.PositiveIntegerField(default=0, verbose_name=_("request count"))
+    start = models.DateTimeField(db_index=True, verbose_name=_("start"))
+    user_agent: "LogUserAgent | None" = models.ForeignKey(
+        "spodcat_logs.LogUserAgent",
+        on_delete=models.PROTECT,
+        null=True,
+        default=None,
+        db_index=False,
+        related_name="+",
+        verbose_name=_("user agent"),
+    )
+    user_agent_data: "UserAgent | None" = models.ForeignKey(
+        "spodcat_logs.UserAgent",
+        on_delete=models.SET_NULL,
+        null=True,
+        default=None,
+        related_name="+",
+        verbose_name=_("user agent data"),
+    )
+
+    objects: "ListeningSessionManager" = ListeningSessionQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _("listening session")
+        verbose_name_plural = _("listening sessions")
+
+    @classmethod
+    def build(cls, gap: datetime.timedelta = SESSION_GAP) -> int:
+        """
+        Assigns all audio request logs that don't have a session yet to new
+        or existing sessions. Existing sessions that are within `gap` of a
+        new log are rebuilt, so logs arriving late are handled correctly.
+        Returns the number of processed logs.
+        """
+        from spodcat.models import Episode
+
+        lengths = dict(Episode.objects.values_list("podcastcontent_ptr", "audio_file_length"))
+        pending = (
+            PodcastEpisodeAudioRequestLog.objects
+            .filter(session=None)
+            .order_by("episode", "remote_addr", "user_agent", "created")
+            .values(*cls._log_fields())
+        )
+        processed = 0
+
+        for key, logs in itertools.groupby(
+            pending.iterator(chunk_size=2000),
+            key=lambda log: (log["episode_id"], log["remote_addr"], log["user_agent_id"]),
+        ):
+            logs = list(logs)
+            processed += len(logs)
+            cls._build_for_key(key, logs, gap, lengths.get(key[0], 0))
+            logger.info("Processed %d logs", processed)
+
+        return processed
+
+    @classmethod
+    def _build_for_key(cls, key: tuple, logs: list[dict], gap: datetime.timedelta, audio_file_length: int):
+        episode_id, remote_addr, user_agent_id = key
+
+        with transaction.atomic():
+            touched = cls.objects.filter(
+                episode=episode_id,
+                remote_addr=remote_addr,
+                user_agent=user_agent_id,
+                end__gte=logs[0]["created"] - gap,
+                start__lte=logs[-1]["created"] + gap,
+            )
+            touched_logs = PodcastEpisodeAudioRequestLog.objects.filter(session__in=touched).values(*cls._log_fields())
+            logs = sorted(logs + list(touched_logs), key=lambda log: log["created"])
+            touched.delete()
+
+            for session_data in group_sessions(logs, gap):
+                bytes_covered = session_data.get_bytes_covered(audio_file_length)
+                session = cls.objects.create(
+                    bytes_covered=bytes_covered,
+                    covered_fraction=bytes_covered / audio_file_length if audio_file_length else 0.0,
+                    end=session_data.end,
+                    episode_id=episode_id,
+                    is_bot=session_data.is_bot,
+                    remote_addr=remote_addr,
+                    request_count=len(session_data.log_ids),
+                    start=session_data.start,
+                    user_agent_id=user_agent_id,
+                    user_agent_data_id=session_data.user_agent_data_id,
+                )
+                PodcastEpisodeAudioRequestLog.objects.filter(pk__in=session_data.log_ids).update(session=session)
+
+    @classmethod
+    def reclassify(cls, chunk_size: int = 1000, user_agents: "dict[str, UserAgent | None] | None" = None) -> int:
+        """
+        Like RequestLog.reclassify(), but without rebuilding the sessions,
+        since their boundaries don't depend on classification.
+        """
+        user_agents = {} if user_agents is None else user_agents
+        pairs = list(
+            cls.objects.order_by().values_list("user_agent", "user_agent__value", "remote_addr").distinct()
+        )
+        updated = 0
+
+        for user_agent_id, user_agent, remote_addr in pairs:
+            is_bot, _, user_agent_obj = classify_request(user_agent or "", remote_addr, user_agents)
+            updated += update_in_chunks(
+                cls.objects
+                .filter(user_agent=user_agent_id, remote_addr=remote_addr)
+                .exclude(is_bot=is_bot, user_agent_data=user_agent_obj),
+                chunk_size=chunk_size,
+                is_bot=is_bot,
+                user_agent_data=user_agent_obj,
+            )
+
+        return updated
+
+    @staticmethod
+    def _log_fields():
+        return [
+            "created",
+            "duration_ms",
+            "episode_id",
+            "id",
+            "is_bot",
+            "range_start",
+            "remote_addr",
+            "response_body_size",
+            "user_agent_id",
+            "user_agent_data_id",
+        ]
+
+
 class PodcastRssRequestLog(RequestLog):
     podcast: "Podcast" = models.ForeignKey(
         "spodcat.Podcast",
@@ -346,5 +683,51 @@ class PodcastRssRequestLog(RequestLog):
         related_name="rss_requests",
         verbose_name=_("podcast"),
     )
+    # Number of requests this row represents; > 1 for compacted rows.
+    request_count = models.PositiveIntegerField(default=1, verbose_name=_("request count"))
 
     objects: "PodcastRssRequestLogManager" = PodcastRssRequestLogQuerySet.as_manager()
+
+    @classmethod
+    def compact(cls, older_than: datetime.datetime, chunk_size: datetime.timedelta = datetime.timedelta(days=1)):
+        """
+        Collapses rows created before `older_than` into one row per podcast,
+        hour, IP and user agent, with `request_count` holding the total
+        number of requests. Works in chunks of `chunk_size`, each in its own
+        transaction, and yields (chunk start, number of deleted rows) after
+        each chunk.
+        """
+        older_than = older_than.replace(minute=0, second=0, microsecond=0)
+        first = cls.objects.filter(created__lt=older_than).aggregate(first=Min("created"))["first"]
+        if first is None:
+            return
+
+        chunk_start = first.replace(minute=0, second=0, microsecond=0)
+
+        while chunk_start < older_than:
+            chunk_end = min(chunk_start + chunk_size, older_than)
+            deleted = 0
+
+            with transaction.atomic():
+                groups = list(
+                    cls.objects
+                    .filter(created__gte=chunk_start, created__lt=chunk_end)
+                    .order_by()
+                    .values("podcast", "remote_addr", "user_agent", hour=Trunc("created", "hour"))
+                    .annotate(rows=Count("id"), total=Sum("request_count"), keep=Min("id"))
+                    .filter(rows__gt=1)
+                )
+
+                for group in groups:
+                    rows = cls.objects.filter(
+                        podcast=group["podcast"],
+                        remote_addr=group["remote_addr"],
+                        user_agent=group["user_agent"],
+                        created__gte=group["hour"],
+                        created__lt=group["hour"] + datetime.timedelta(hours=1),
+                    )
+                    deleted += rows.exclude(pk=group["keep"]).delete()[0]
+                    rows.filter(pk=group["keep"]).update(created=group["hour"], request_count=group["total"])
+
+            yield chunk_start, deleted
+            chunk_start = chunk_end
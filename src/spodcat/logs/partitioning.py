@@ -0,0 +1,241 @@
+"""
+Optional storage mode for the request log tables: range partitioning by
+month on `created`, using Postgres declarative partitioning. Tables are
+converted once with `partition_request_logs --convert`, after which the
+same command should be run regularly (e.g. daily) to create partitions
+ahead of time and to archive partitions older than LOG_RETENTION_MONTHS.
+"""
+import datetime
+import gzip
+import logging
+import re
+import tempfile
+from dataclasses import dataclass
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import default_storage, storages
+from django.db import connections, transaction
+
+from spodcat.settings import spodcat_settings
+from spodcat.utils import Month
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Partition:
+    name: str
+    upper_bound: datetime.datetime | None
+
+
+def archive_partition(table: str, partition: Partition, using: str = "default") -> str:
+    """
+    Exports the partition as gzipped CSV to the configured archive storage,
+    then detaches and drops it. Returns the name of the archive file. If
+    the export fails, the partition is left as it was.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    storage = get_archive_storage()
+    archive_name = f"{spodcat_settings.LOG_ARCHIVE_PATH.strip('/')}/{table}/{partition.name}.csv.gz"
+
+    with tempfile.TemporaryFile() as temp_file:
+        with gzip.GzipFile(fileobj=temp_file, mode="wb") as gz, connection.cursor() as cursor:
+            sql = f"COPY {qn(partition.name)} TO STDOUT WITH (FORMAT csv, HEADER)"
+            if hasattr(cursor, "copy"):
+                # psycopg 3
+                with cursor.copy(sql) as copy:
+                    for data in copy:
+                        gz.write(data)
+            else:
+                # psycopg2
+                cursor.copy_expert(sql, gz)
+        temp_file.seek(0)
+        archive_name = storage.save(archive_name, File(temp_file))
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(partition.name)}")
+        cursor.execute(f"DROP TABLE {qn(partition.name)}")
+
+    logger.info("Archived partition %s to %s", partition.name, archive_name)
+    return archive_name
+
+
+def convert_table(table: str, using: str = "default"):
+    """
+    Converts a regular log table to a partitioned one. The existing table is
+    attached as a single "legacy" partition, covering everything up to the
+    start of next month, so no data has to be moved.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    legacy = f"{table}_plegacy"
+    upper_bound = (Month() + 1).date
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype = 'f'
+            """,
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+
+        cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(legacy)}")
+        cursor.execute(
+            f"CREATE TABLE {qn(table)} (LIKE {qn(legacy)} INCLUDING DEFAULTS INCLUDING IDENTITY "
+            f"INCLUDING CONSTRAINTS) PARTITION BY RANGE (created)"
+        )
+        cursor.execute(f"ALTER TABLE {qn(table)} ADD PRIMARY KEY (id, created)")
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE((SELECT MAX(id) FROM {qn(legacy)}), 0) + 1, "
+            "false)",
+            [qn(table)],
+        )
+        cursor.execute(f"ALTER TABLE {qn(legacy)} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+        cursor.execute(f"ALTER TABLE {qn(legacy)} ALTER COLUMN id DROP DEFAULT")
+
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {qn(legacy)} DROP CONSTRAINT {qn(name)}")
+
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(legacy)} "
+            f"FOR VALUES FROM (MINVALUE) TO ({get_bound_literal(upper_bound)})"
+        )
+
+        for name, definition in foreign_keys:
+            cursor.execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}")
+
+        # Existing equivalent indexes on the legacy partition are attached
+        # rather than rebuilt.
+        for column in get_indexed_columns(table):
+            cursor.execute(f"CREATE INDEX ON {qn(table)} ({qn(column)})")
+
+    logger.info("Converted %s to a partitioned table", table)
+
+
+def create_partitions(table: str, months_ahead: int, using: str = "default") -> list[str]:
+    """
+    Makes sure there are monthly partitions from the current month up to and
+    including `months_ahead` months from now. Returns names of the created
+    partitions.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    covered_until = max(
+        (p.upper_bound for p in get_partitions(table, using) if p.upper_bound),
+        default=None,
+    )
+    created = []
+
+    for month in Month().range(months_ahead + 1):
+        start = month.date
+        end = (month + 1).date
+
+        if covered_until and datetime.datetime.combine(end, datetime.time(), datetime.timezone.utc) <= covered_until:
+            continue
+
+        name = f"{table}_p{start.year}{start.month:02d}"
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {qn(name)} PARTITION OF {qn(table)} "
+                f"FOR VALUES FROM ({get_bound_literal(start)}) TO ({get_bound_literal(end)})"
+            )
+        created.append(name)
+
+    return created
+
+
+def get_archive_storage():
+    storage = spodcat_settings.LOG_ARCHIVE_STORAGE
+    if isinstance(storage, str):
+        return storages[storage]
+    return storage or default_storage
+
+
+def get_bound_literal(date: datetime.date) -> str:
+    # Only ever used with dates we have generated ourselves, since DDL
+    # statements don't take query parameters.
+    return f"'{date.isoformat()} 00:00:00+00'"
+
+
+def get_indexed_columns(table: str) -> list[str]:
+    model = next(m for m in get_log_models() if m._meta.db_table == table)
+    return [
+        f.column for f in model._meta.local_concrete_fields
+        if f.db_index and not f.primary_key
+    ]
+
+
+def get_log_models():
+    from spodcat.logs.models import RequestLog
+
+    return [m for m in apps.get_app_config("spodcat_logs").get_models() if issubclass(m, RequestLog)]
+
+
+def get_partitions(table: str, using: str = "default") -> list[Partition]:
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+            """,
+            [table],
+        )
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound in rows:
+        m = re.search(r"TO \('([^']+)'\)", bound or "")
+        upper_bound = parse_bound(m.group(1)) if m else None
+        partitions.append(Partition(name=name, upper_bound=upper_bound))
+
+    return partitions
+
+
+def is_partitioned(table: str, using: str = "default") -> bool:
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [table])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def maintain_partitions(using: str = "default", archive: bool = True) -> dict[str, dict[str, list[str]]]:
+    """
+    Creates future partitions and, if LOG_RETENTION_MONTHS is set, archives
+    partitions entirely older than the retention window for all partitioned
+    log tables.
+    """
+    retention_months = spodcat_settings.LOG_RETENTION_MONTHS
+    result = {}
+
+    for model in get_log_models():
+        table = model._meta.db_table
+        if not is_partitioned(table, using):
+            continue
+
+        created = create_partitions(table, spodcat_settings.LOG_PARTITION_MONTHS_AHEAD, using)
+        archived = []
+
+        if archive and retention_months:
+            cutoff_date = (Month() - retention_months).date
+            cutoff = datetime.datetime.combine(cutoff_date, datetime.time(), datetime.timezone.utc)
+            for partition in get_partitions(table, using):
+                if partition.upper_bound and partition.upper_bound <= cutoff:
+                    archived.append(archive_partition(table, partition, using))
+
+        result[table] = {"created": created, "archived": archived}
+
+    return result
+
+
+def parse_bound(value: str) -> datetime.datetime:
+    """
+    Parses a timestamptz partition bound, e.g. '2026-11-01 00:00:00+00'.
+    Before Python 3.11, fromisoformat() requires minutes in the offset.
+    """
+    return datetime.datetime.fromisoformat(re.sub(r"([+-]\d{2})$", r"\1:00", value))
@@ -1,5 +1,5 @@
-from datetime import date
-from typing import TYPE_CHECKING
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, TypeVar
 
 from django.db.models import (
     Count,
@@ -14,18 +14,94 @@ from django.db.models import (
 from django.db.models.functions import Cast, Coalesce, Concat, Round
 
 from spodcat.logs.chart_data import DailyChartData, MonthChartData
+from spodcat.utils import date_to_datetime
 
 
 if TYPE_CHECKING:
     from django.contrib.auth.models import AbstractUser, AnonymousUser
 
     from spodcat.logs.models import (
+        ListeningSession,
         PodcastEpisodeAudioRequestLog,
         PodcastRssRequestLog,
+        RequestLog,
     )
 
+    _RL = TypeVar("_RL", bound=RequestLog)
 
-class PodcastRssRequestLogQuerySet(QuerySet["PodcastRssRequestLog"]):
+
+class RequestLogQuerySet(QuerySet["_RL"]):
+    def filter_created_between(self, start_date: date, end_date: date):
+        # Plain range on `created` instead of `created__date`, so that
+        # partitioned log tables can be pruned.
+        return self.filter(
+            created__gte=date_to_datetime(start_date),
+            created__lt=date_to_datetime(end_date + timedelta(days=1)),
+        )
+
+
+class ListeningSessionQuerySet(QuerySet["ListeningSession"]):
+    def filter_by_user(self, user: "AbstractUser | AnonymousUser"):
+        if user.is_superuser:
+            return self
+        if not user.is_staff:
+            return self.none()
+        return self.filter(Q(episode__podcast__owner=user) | Q(episode__podcast__authors=user))
+
+    def get_episode_play_count_chart_data(self, start_date: date, end_date: date):
+        qs = (
+            self.order_by()
+            .filter(start__gte=start_date, start__lte=end_date)
+            .values(name=F("episode__name"), slug=F("episode__slug"), date=F("start__date"))
+            .annotate(y=Sum(F("covered_fraction")))
+            .exclude(y=0.0)
+            .values("name", "slug", "date", "y")
+            .order_by("slug", "date")
+        )
+        return DailyChartData(qs, start_date, end_date)
+
+    def get_play_count_query(self, **filters):
+        return (
+            self
+            .filter(**filters)
+            .order_by()
+            .values(*filters.keys())
+            .annotate(play_count=Coalesce(Sum(F("covered_fraction")), V(0.0), output_field=FloatField()))
+            .values("play_count")
+        )
+
+    def get_podcast_play_count_chart_data(self, start_date: date, end_date: date):
+        qs = (
+            self.order_by()
+            .filter(start__gte=start_date, start__lte=end_date)
+            .values(name=F("episode__podcast__name"), slug=F("episode__podcast__slug"), date=F("start__date"))
+            .annotate(y=Sum(F("covered_fraction")))
+            .values("name", "slug", "date", "y")
+            .order_by("slug", "date")
+        )
+        return DailyChartData(qs, start_date, end_date)
+
+    def get_unique_ips_chart_data(self, start_date: date, end_date: date):
+        qs = (
+            self.order_by()
+            .filter(start__date__gte=start_date, start__date__lte=end_date)
+            .values(
+                month=F("start__date__month"),
+                year=F("start__date__year"),
+                name=F("episode__podcast__name"),
+                slug=F("episode__podcast__slug"),
+            )
+            .annotate(y=Count("remote_addr", distinct=True))
+            .values("month", "year", "y", "name", "slug")
+            .order_by("slug", "year", "month")
+        )
+        return MonthChartData(qs, start_date, end_date)
+
+    def with_percent_covered(self):
+        return self.annotate(percent_covered=Cast(F("covered_fraction") * V(100), FloatField()))
+
+
+class PodcastRssRequestLogQuerySet(RequestLogQuerySet["PodcastRssRequestLog"]):
     def filter_by_user(self, user: "AbstractUser | AnonymousUser"):
         if user.is_superuser:
             return self
@@ -36,7 +112,7 @@ class PodcastRssRequestLogQuerySet(QuerySet["PodcastRssRequestLog"]):
     def get_unique_ips_chart_data(self, start_date: date, end_date: date):
         qs = (
             self.order_by()
-            .filter(created__date__gte=start_date, created__date__lte=end_date)
+            .filter_created_between(start_date, end_date)
             .values(
                 month=F("created__date__month"),
                 year=F("created__date__year"),
@@ -50,7 +126,7 @@ class PodcastRssRequestLogQuerySet(QuerySet["PodcastRssRequestLog"]):
         return MonthChartData(qs, start_date, end_date)
 
 
-class PodcastEpisodeAudioRequestLogQuerySet(QuerySet["PodcastEpisodeAudioRequestLog"]):
+class PodcastEpisodeAudioRequestLogQuerySet(RequestLogQuerySet["PodcastEpisodeAudioRequestLog"]):
     def filter_by_user(self, user: "AbstractUser | AnonymousUser"):
         if user.is_superuser:
             return self
@@ -117,7 +193,7 @@ class PodcastEpisodeAudioRequestLogQuerySet(QuerySet["PodcastEpisodeAudioRequest
     def get_unique_ips_chart_data(self, start_date: date, end_date: date):
         qs = (
             self.order_by()
-            .filter(created__date__gte=start_date, created__date__lte=end_date)
+            .filter_created_between(start_date, end_date)
             .values(
                 month=F("created__date__month"),
                 year=F("created__date__year"),
@@ -154,6 +230,8 @@ class PodcastEpisodeAudioRequestLogQuerySet(QuerySet["PodcastEpisodeAudioRequest
 if TYPE_CHECKING:
     from django.db.models.manager import Manager
 
+    class ListeningSessionManager(Manager[ListeningSession], ListeningSessionQuerySet): ...
+
     class PodcastEpisodeAudioRequestLogManager(
         Manager[PodcastEpisodeAudioRequestLog],
         PodcastEpisodeAudioRequestLogQuerySet,
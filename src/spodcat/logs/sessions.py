@@ -0,0 +1,69 @@
+import datetime
+from dataclasses import dataclass, field
+from typing import Generator, Iterable
+
+
+SESSION_GAP = datetime.timedelta(minutes=30)
+
+
+@dataclass
+class SessionData:
+    start: datetime.datetime
+    end: datetime.datetime
+    is_bot: bool = False
+    log_ids: list[int] = field(default_factory=list)
+    ranges: list[tuple[int, int]] = field(default_factory=list)
+    user_agent_data_id: str | None = None
+
+    def add_log(self, log: dict):
+        self.end = max(self.end, get_log_end(log))
+        self.is_bot = self.is_bot or log["is_bot"]
+        self.log_ids.append(log["id"])
+        self.user_agent_data_id = self.user_agent_data_id or log["user_agent_data_id"]
+
+        if log["response_body_size"] > 0:
+            # Logs without a known range start are assumed to start at 0,
+            # which at worst underestimates the coverage of resumed plays.
+            range_start = log["range_start"] or 0
+            self.ranges.append((range_start, range_start + log["response_body_size"]))
+
+    def get_bytes_covered(self, audio_file_length: int | None = None) -> int:
+        ranges = self.ranges
+        if audio_file_length:
+            ranges = [(start, min(end, audio_file_length)) for start, end in ranges]
+        return sum(end - start for start, end in merge_ranges(ranges))
+
+
+def get_log_end(log: dict) -> datetime.datetime:
+    return log["created"] + datetime.timedelta(milliseconds=log["duration_ms"] or 0)
+
+
+def group_sessions(logs: Iterable[dict], gap: datetime.timedelta = SESSION_GAP) -> "Generator[SessionData]":
+    """
+    `logs` are dicts with PodcastEpisodeAudioRequestLog values, all with the
+    same episode, IP and user agent, and sorted by `created`.
+    """
+    session: SessionData | None = None
+
+    for log in logs:
+        if session is None or log["created"] - session.end > gap:
+            if session is not None:
+                yield session
+            session = SessionData(start=log["created"], end=log["created"])
+        session.add_log(log)
+
+    if session is not None:
+        yield session
+
+
+def merge_ranges(ranges: Iterable[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Merges overlapping and adjacent half-open byte ranges."""
+    merged: list[tuple[int, int]] = []
+
+    for start, end in sorted(r for r in ranges if r[1] > r[0]):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    return merged
@@ -1,3 +1,4 @@
+import functools
 import json
 import re
 from dataclasses import dataclass
@@ -84,6 +85,7 @@ def get_referrer_dict(referrer: str) -> ReferrerDict | None:
     return get_dict_from_file("referrers", referrer)
 
 
+@functools.lru_cache(maxsize=2000)
 def get_useragent_data(user_agent: str) -> UserAgentData | None:
     basenames: list[tuple[UserAgentType, str]] = [
         (UserAgentType.BOT, "bots"),
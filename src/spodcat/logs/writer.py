@@ -0,0 +1,123 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from django.db import connection
+from django.utils import timezone
+
+
+if TYPE_CHECKING:
+    import datetime
+
+    from django.http import HttpRequest
+
+    from spodcat.logs.models import RequestLog
+
+
+logger = logging.getLogger(__name__)
+
+_audio_request_log_writer: "BatchedLogWriter | None" = None
+_audio_request_log_writer_lock = threading.Lock()
+
+
+class BatchedLogWriter:
+    """
+    Writes request logs from a background thread, `batch_size` at a time
+    or at least every `flush_interval` seconds, so requests don't have to
+    wait for user agent parsing, GeoIP lookups and database inserts.
+    Records are dropped (with a warning) if more than `max_queue_size` are
+    waiting, rather than slowing down requests.
+    """
+    def __init__(
+        self,
+        model: "type[RequestLog]",
+        batch_size: int = 100,
+        flush_interval: float = 5.0,
+        max_queue_size: int = 10_000,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.model = model
+        self.queue: queue.Queue[dict] = queue.Queue(maxsize=max_queue_size)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+
+    def flush(self):
+        """Writes whatever is queued, in the calling thread."""
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self.write(batch)
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            self.write(batch)
+
+    def submit(self, **kwargs):
+        """Queues a log with `kwargs` for RequestLog.create(). Never blocks."""
+        try:
+            self.queue.put_nowait(kwargs)
+        except queue.Full:
+            logger.warning("%s queue is full, dropping log", self.model.__name__)
+
+    def write(self, batch: list[dict]):
+        try:
+            self.model.objects.bulk_create([self.model.create(save=False, **kwargs) for kwargs in batch])
+        except Exception as e:
+            logger.error("Could not write %d %s logs", len(batch), self.model.__name__, exc_info=e)
+        finally:
+            connection.close()
+
+
+def get_audio_request_log_writer() -> BatchedLogWriter:
+    global _audio_request_log_writer
+
+    from spodcat.logs.models import PodcastEpisodeAudioRequestLog
+
+    with _audio_request_log_writer_lock:
+        if _audio_request_log_writer is None:
+            _audio_request_log_writer = BatchedLogWriter(PodcastEpisodeAudioRequestLog)
+        return _audio_request_log_writer
+
+
+def log_audio_request(
+    request: "HttpRequest",
+    episode_id: str,
+    started: "datetime.datetime",
+    status_code: int,
+    range_start: int | None,
+    response_body_size: int,
+):
+    """Queues a PodcastEpisodeAudioRequestLog for `request`."""
+    get_audio_request_log_writer().submit(
+        user_agent=request.headers.get("User-Agent", ""),
+        remote_addr=request.META.get("REMOTE_ADDR", None),
+        referrer=request.headers.get("Referer", ""),
+        path_info=request.path_info,
+        created=started,
+        duration_ms=round((timezone.now() - started).total_seconds() * 1000),
+        episode_id=episode_id,
+        range_start=range_start,
+        response_body_size=response_body_size,
+        status_code=str(status_code),
+    )
@@ -0,0 +1,36 @@
+from django.core.management import BaseCommand
+from django.db.models import Count, Q
+
+from spodcat.models import Episode, Job
+from spodcat.waveform import PYRAMID_RESOLUTIONS
+
+
+class Command(BaseCommand):
+    help = "Generates waveform pyramids for episodes that are missing them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Regenerate waveforms for all episodes.")
+        parser.add_argument("--queue", action="store_true", help="Queue jobs instead of running the analysis here.")
+
+    def handle(self, *args, **options):
+        episodes = Episode.objects.exclude(Q(audio_file="") | Q(audio_file=None))
+
+        if not options["all"]:
+            episodes = (
+                episodes
+                .annotate(waveform_count=Count("waveforms", filter=Q(waveforms__resolution__in=PYRAMID_RESOLUTIONS)))
+                .filter(waveform_count__lt=len(PYRAMID_RESOLUTIONS))
+            )
+
+        episodes = list(episodes)
+        self.stdout.write(f"Found {len(episodes)} episodes in need of updating.")
+
+        for episode in episodes:
+            if options["queue"]:
+                Job.enqueue("episode_audio_data", episode=episode)
+            else:
+                self.stdout.write(f"Analyzing audio for {episode} ...")
+                episode.get_dbfs_and_duration()
+
+        if options["queue"]:
+            self.stdout.write("Jobs queued. Run the run_jobs command if there is no worker running.")
@@ -0,0 +1,219 @@
+import hashlib
+import hmac
+import time
+from urllib.parse import urlencode
+
+import numpy as np
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.files.storage import Storage
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from pydub import AudioSegment
+from rest_framework.request import Request
+from rest_framework_json_api.utils import get_resource_type_from_serializer
+
+from spodcat.models import Episode, Podcast
+from spodcat.models.querysets import EpisodeQuerySet
+from spodcat.settings import spodcat_settings
+from spodcat.storage import StorageProxy, UrlCachingStorage, url_cache
+from spodcat.utils import split_audio_segment
+from spodcat.views import EpisodeViewSet
+from spodcat.waveform import (
+    BUCKET_COUNT,
+    MIN_DBFS,
+    get_pcm_dbfs_array,
+    normalize_dbfs_values,
+)
+
+
+class SigningStorage(StorageProxy):
+    """Adds an HMAC signature to URLs, roughly like presigned S3 URLs."""
+    def url(self, name):
+        expires = 1_000_000_000
+        signature = hmac.new(b"benchmark", f"GET\n{name}\n{expires}".encode(), hashlib.sha256).hexdigest()
+        return self.storage.url(name) + "?" + urlencode({"Expires": expires, "Signature": signature})
+
+
+def get_reference_dbfs_array(audio: AudioSegment) -> list[float]:
+    # The original, AudioSegment based implementation.
+    dbfs_values = [max(s.dBFS, MIN_DBFS) for s in split_audio_segment(audio, BUCKET_COUNT)]
+    return normalize_dbfs_values(dbfs_values)
+
+
+class Command(BaseCommand):
+    help = "Checks the results of, and benchmarks, optimized code paths against their original implementations."
+
+    def add_arguments(self, parser):
+        parser.add_argument("target", choices=["dbfs", "queries", "urls"])
+        parser.add_argument("--seconds", type=int, default=600, help="dbfs: Length of generated audio.")
+        parser.add_argument("--sample-rate", type=int, default=44100, help="dbfs: Sample rate.")
+        parser.add_argument("--episodes", type=int, default=1000, help="urls: Number of episodes in the feed.")
+        parser.add_argument("--renders", type=int, default=10, help="urls: Number of times to render the feed.")
+        parser.add_argument(
+            "--signed",
+            action="store_true",
+            help="urls: Simulate signed URLs on top of the configured storages.",
+        )
+
+    def benchmark_dbfs(self, seconds: int, sample_rate: int):
+        rng = np.random.default_rng(0)
+        failed = False
+
+        for bits in (8, 16, 24):
+            for channels in (1, 2):
+                max_value = 2 ** (bits - 1) - 1
+                frames = seconds * sample_rate
+                # Noise with a slowly varying amplitude, so there is some
+                # dynamic range to normalize.
+                envelope = (np.sin(np.linspace(0, 20, frames)) + 1.1) / 2.1
+                samples = (rng.uniform(-1, 1, (frames, channels)) * envelope[:, None] * max_value).astype(np.int32)
+
+                if bits == 24:
+                    raw = samples.astype("<i4").view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+                    # pydub stores 24 bit audio as 32 bit, with values
+                    # shifted 8 bits. That conversion is done in pure Python
+                    # at load time, so it isn't included in the timing,
+                    # while our own conversion is.
+                    audio = AudioSegment(
+                        (samples << 8).astype("<i4").tobytes(),
+                        sample_width=4,
+                        frame_rate=sample_rate,
+                        channels=channels,
+                    )
+                else:
+                    raw = samples.astype(f"<i{bits // 8}").tobytes()
+                    audio = AudioSegment(raw, sample_width=bits // 8, frame_rate=sample_rate, channels=channels)
+
+                started = time.perf_counter()
+                reference = get_reference_dbfs_array(audio)
+                reference_time = time.perf_counter() - started
+
+                started = time.perf_counter()
+                result = get_pcm_dbfs_array(raw, bits // 8, sample_rate, channels)
+                result_time = time.perf_counter() - started
+
+                diff = max((abs(a - b) for a, b in zip(reference, result)), default=0.0)
+                # RMS values are floored, which pydub does after the 8 bit
+                # shift, so 24 bit results can differ very slightly.
+                ok = len(reference) == len(result) and diff < (1e-3 if bits == 24 else 1e-6)
+                failed = failed or not ok
+
+                self.stdout.write(
+                    f"{bits:2d} bit, {channels} ch: original {reference_time:.3f}s, numpy {result_time:.3f}s "
+                    f"({reference_time / result_time:.1f}x), max diff {diff:.2e} {'OK' if ok else 'MISMATCH'}"
+                )
+
+        if failed:
+            raise CommandError("Results differ from the original implementation.")
+
+    def benchmark_queries(self):
+        # Checks which of the heavy Episode columns are selected by the
+        # admin changelist and by the API, for a few typical requests.
+        factory = RequestFactory()
+        failed = False
+        columns = {}
+        for name in EpisodeQuerySet.heavy_fields:
+            field = Episode._meta.get_field(name)
+            table = connection.ops.quote_name(field.model._meta.db_table)
+            columns[name] = f"{table}.{connection.ops.quote_name(field.column)}"
+
+        def get_changelist_sql():
+            request = factory.get(reverse("admin:spodcat_episode_changelist"))
+            request.resolver_match = resolve(request.path)
+            request.user = get_user_model()(is_active=True, is_staff=True, is_superuser=True)
+            return str(admin.site.get_model_admin(Episode).get_changelist_instance(request).queryset.query)
+
+        fieldset_param = f"fields[{get_resource_type_from_serializer(EpisodeViewSet.serializer_class)}]"
+
+        def get_api_sql(action: str, **params):
+            view = EpisodeViewSet(action=action, format_kwarg=None, kwargs={})
+            view.request = Request(factory.get("/", params))
+            return str(view.get_queryset().query)
+
+        cases = [
+            ("admin changelist", get_changelist_sql, []),
+            ("API list", lambda: get_api_sql("list"), list(columns)),
+            ("API list, sparse", lambda: get_api_sql("list", **{fieldset_param: "name,slug"}), []),
+            (
+                "API list, sparse with description",
+                lambda: get_api_sql("list", **{fieldset_param: "description_html"}),
+                ["description"],
+            ),
+            ("API retrieve", lambda: get_api_sql("retrieve"), list(columns)),
+            ("API chapters", lambda: get_api_sql("chapters"), []),
+        ]
+
+        for label, get_sql, expected in cases:
+            sql = get_sql()
+            selected = [name for name, column in columns.items() if column in sql]
+            ok = selected == expected
+            failed = failed or not ok
+            self.stdout.write(f"{label}: {', '.join(selected) or 'none'} {'OK' if ok else f'EXPECTED {expected}'}")
+
+        if failed:
+            raise CommandError("Heavy fields are selected where they shouldn't be, or the other way around.")
+
+    def benchmark_urls(self, episodes: int, renders: int, signed: bool):
+        # The file URLs of a feed with `episodes` episodes (unsaved, so the
+        # database isn't involved), generated by the storages that
+        # UrlCachingStorage wraps and through UrlCachingStorage.
+        if not spodcat_settings.MEDIA_URL_CACHE_TTL:
+            raise CommandError("MEDIA_URL_CACHE_TTL is not set.")
+
+        podcast = Podcast(slug="benchmark", cover="benchmark/images/cover.jpg")
+        files = [podcast.cover]
+        for number in range(episodes):
+            episode = Episode(
+                podcast=podcast,
+                audio_file=f"benchmark/episodes/{number}.mp3",
+                image=f"benchmark/images/episodes/{number}/image.jpg",
+                image_thumbnail=f"benchmark/images/episodes/{number}/thumbnail.jpg",
+            )
+            files.extend([episode.audio_file, episode.image, episode.image_thumbnail])
+
+        storages: dict[Storage, tuple[Storage, Storage]] = {}
+        pairs = []
+        for file in files:
+            inner = file.storage.storage
+            if inner not in storages:
+                base = SigningStorage(inner) if signed else inner
+                storages[inner] = (base, UrlCachingStorage(base))
+            pairs.append((file.name, *storages[inner]))
+
+        url_cache.clear()
+        uncached_times = []
+        cached_times = []
+        ok = True
+
+        for _ in range(renders):
+            started = time.perf_counter()
+            uncached = [base.url(name) for name, base, _ in pairs]
+            uncached_times.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            cached = [caching.url(name) for name, _, caching in pairs]
+            cached_times.append(time.perf_counter() - started)
+
+            ok = ok and cached == uncached
+
+        uncached_avg = sum(uncached_times) / renders
+        cached_avg = sum(cached_times[1:]) / (renders - 1) if renders > 1 else cached_times[0]
+        self.stdout.write(
+            f"{episodes} episodes, {len(pairs)} URLs per feed: uncached {uncached_avg * 1000:.2f}ms, "
+            f"cached {cached_times[0] * 1000:.2f}ms first / {cached_avg * 1000:.2f}ms after "
+            f"({uncached_avg / cached_avg:.1f}x) {'OK' if ok else 'MISMATCH'}"
+        )
+
+        if not ok:
+            raise CommandError("Cached URLs differ from uncached ones.")
+
+    def handle(self, *args, **options):
+        if options["target"] == "dbfs":
+            self.benchmark_dbfs(options["seconds"], options["sample_rate"])
+        elif options["target"] == "queries":
+            self.benchmark_queries()
+        elif options["target"] == "urls":
+            self.benchmark_urls(options["episodes"], options["renders"], options["signed"])
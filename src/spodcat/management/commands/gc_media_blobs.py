@@ -0,0 +1,25 @@
+import datetime
+
+from django.core.management import BaseCommand
+
+from spodcat.models import MediaBlob
+from spodcat.models.media_blob import GC_MIN_AGE
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes deduplicated media files (see the DEDUPLICATE_MEDIA setting) that are no longer used. Run it "
+        "periodically, e.g. daily."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=int(GC_MIN_AGE.total_seconds()),
+            help="Only delete files that have been unused for at least this many seconds.",
+        )
+
+    def handle(self, *args, **options):
+        deleted = MediaBlob.collect_garbage(min_age=datetime.timedelta(seconds=options["min_age"]))
+        self.stdout.write(f"{deleted} unused media file(s) deleted.")
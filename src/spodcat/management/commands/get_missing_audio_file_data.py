@@ -1,17 +1,114 @@
+import datetime
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 from django.core.management import BaseCommand
+from django.db import connection, connections
 from django.db.models import Q
 
 from spodcat.models import Episode
 
 
+def init_worker(memory_limit_mb: int):
+    if memory_limit_mb:
+        import resource
+
+        # Applies to this process and to the ffmpeg processes it starts.
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def process_episode(pk):
+    try:
+        Episode.objects.get(pk=pk).get_dbfs_and_duration()
+    finally:
+        connection.close()
+
+
 class Command(BaseCommand):
+    help = (
+        "Gets duration and dBFS data for episodes that are missing it. Progress is saved per episode, so an "
+        "interrupted run can just be restarted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=1, help="Number of episodes to process in parallel.")
+        parser.add_argument(
+            "--memory-limit",
+            type=int,
+            default=2048,
+            help="Max address space per worker process in MB, or 0 for no limit. Only used with --workers > 1.",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Only list the episodes that would be processed.")
+
     def handle(self, *args, **options):
         episodes = list(
             Episode.objects
             .exclude(Q(audio_file="") | Q(audio_file=None))
             .filter(Q(dbfs_array=[]) | Q(duration_seconds=0))
+            .order_by("published", "pk")
         )
         self.stdout.write(f"Found {len(episodes)} episodes in need of updating.")
-        for episode in episodes:
+
+        if options["dry_run"]:
+            for episode in episodes:
+                self.stdout.write(f"{episode.pk}: {episode} ({episode.audio_file.name})")
+            return
+
+        if options["workers"] > 1:
+            self.process_parallel(episodes, options["workers"], options["memory_limit"])
+        else:
+            self.process_sequential(episodes)
+
+    def process_parallel(self, episodes: list[Episode], workers: int, memory_limit_mb: int):
+        started = time.monotonic()
+        names = {episode.pk: str(episode) for episode in episodes}
+        failed = 0
+
+        # Forked workers must not inherit open database connections. Forking
+        # (rather than spawning) means Django is already set up in them.
+        connections.close_all()
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=init_worker,
+            initargs=(memory_limit_mb,),
+        )
+
+        with pool:
+            futures = {pool.submit(process_episode, episode.pk): episode.pk for episode in episodes}
+
+            for done, future in enumerate(as_completed(futures), start=1):
+                pk = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"Failed for {names[pk]}: {e!r}")
+                self.write_progress(done, len(episodes), started, names[pk])
+
+        if failed:
+            self.stderr.write(f"{failed} episode(s) failed; run the command again to retry them.")
+
+    def process_sequential(self, episodes: list[Episode]):
+        started = time.monotonic()
+        failed = 0
+
+        for done, episode in enumerate(episodes, start=1):
             self.stdout.write(f"Getting dBFS and duration data for {episode} ...")
-            episode.get_dbfs_and_duration()
+            try:
+                episode.get_dbfs_and_duration()
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Failed for {episode}: {e!r}")
+            self.write_progress(done, len(episodes), started, str(episode))
+
+        if failed:
+            self.stderr.write(f"{failed} episode(s) failed; run the command again to retry them.")
+
+    def write_progress(self, done: int, total: int, started: float, name: str):
+        elapsed = time.monotonic() - started
+        eta = datetime.timedelta(seconds=round(elapsed / done * (total - done)))
+        elapsed_delta = datetime.timedelta(seconds=round(elapsed))
+        self.stdout.write(f"[{done}/{total}] {name} done, elapsed {elapsed_delta}, ETA {eta}")
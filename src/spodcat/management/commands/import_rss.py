@@ -1,9 +1,88 @@
+import datetime
 import logging
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass
 
 import feedparser
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
 
+from spodcat.feed_import import (
+    Downloader,
+    get_entry_audio_url,
+    get_entry_guid,
+    get_entry_image_url,
+    get_feed_hash,
+)
+from spodcat.jobs import Worker
 from spodcat.models import Episode, Podcast
+from spodcat.settings import spodcat_settings
+
+
+@dataclass
+class EntryImport:
+    entry: feedparser.FeedParserDict
+    episode: Episode
+    # Whether to (re-)download the enclosure and image.
+    audio: bool = True
+    image: bool = True
+
+
+class EpisodeIndex:
+    """
+    A podcast's existing episodes, loaded with one query, for looking up
+    feed entries by GUID; or by number and season, or name, for episodes
+    that were not imported with a GUID.
+    """
+    fields = (
+        "audio_file",
+        "feed_audio_url",
+        "feed_guid",
+        "feed_hash",
+        "feed_image_url",
+        "image",
+        "name",
+        "number",
+        "podcast",
+        "season",
+    )
+
+    def __init__(self, podcast: Podcast):
+        self.by_guid: dict[str, Episode] = {}
+        self.by_name: dict[str, Episode] = {}
+        self.by_number: dict[tuple[float, int | None], Episode] = {}
+
+        if podcast.pk:
+            for episode in Episode.objects.non_polymorphic().filter(podcast=podcast).only(*self.fields):
+                if episode.feed_guid:
+                    self.by_guid[episode.feed_guid] = episode
+                    continue
+                if episode.number is not None:
+                    self.by_number.setdefault((episode.number, episode.season), episode)
+                self.by_name.setdefault(episode.name, episode)
+
+    def find(self, entry: feedparser.FeedParserDict) -> Episode | None:
+        guid = get_entry_guid(entry)
+        if guid in self.by_guid:
+            return self.by_guid[guid]
+
+        try:
+            number = int(entry.itunes_episode)
+        except Exception:
+            number = None
+        try:
+            season = int(entry.itunes_season)
+        except Exception:
+            season = None
+
+        if number is not None:
+            return self.by_number.get((number, season))
+        return self.by_name.get(entry.title)
 
 
 def bool_input(prompt: str, default: bool = True) -> bool:
@@ -20,6 +99,26 @@ class Command(BaseCommand):
         parser.add_argument("slug")
         parser.add_argument("--update", "-u", action="store_true")
         parser.add_argument("--interactive", "-i", action="store_true")
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help=(
+                "Incremental sync: does nothing if the feed hasn't changed since the last sync, and otherwise only "
+                "imports new and changed entries. Media is only downloaded again if its URL has changed."
+            ),
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="Number of episodes to download media for in parallel.",
+        )
+        parser.add_argument(
+            "--max-per-host",
+            type=int,
+            default=4,
+            help="Max number of simultaneous connections to the same host.",
+        )
 
     def handle(self, *args, **options):
         logging.getLogger("podcasts").setLevel(logging.INFO)
@@ -27,6 +126,13 @@ class Command(BaseCommand):
         slug = options["slug"]
         interactive = options["interactive"]
 
+        if options["sync"]:
+            if interactive:
+                raise CommandError("--sync cannot be combined with --interactive.")
+            self.sync(options["url"], slug, options["concurrency"], options["max_per_host"])
+            self.run_jobs()
+            return
+
         podcast = Podcast.objects.filter(slug=slug).first()
 
         if interactive:
@@ -52,24 +158,12 @@ class Command(BaseCommand):
         entries = d.get("entries", [])
         self.stdout.write(f"{len(entries)} entries (episodes) found in feed.")
 
-        for entry in entries:
-            episode: Episode | None = None
-
-            try:
-                number = int(entry.itunes_episode)
-            except Exception:
-                number = None
-            try:
-                season = int(entry.itunes_season)
-            except Exception:
-                season = None
+        index = EpisodeIndex(podcast)
+        to_import: list[EntryImport] = []
 
-            if number is not None:
-                episode = Episode.objects.filter(podcast=podcast, number=number, season=season).first()
-            else:
-                episode = Episode.objects.filter(podcast=podcast, name=entry.title).first()
+        for entry in entries:
+            episode = index.find(entry)
 
-            self.stdout.write(f"season = {season}")
             if interactive:
                 if episode:
                     update = bool_input(f"Episode '{episode}' already exists. Update it?")
@@ -88,4 +182,126 @@ class Command(BaseCommand):
             elif not interactive:
                 self.stdout.write(f"Episode '{entry.title}' already exists - updating")
 
-            episode.update_from_feed(entry)
+            to_import.append(EntryImport(entry=entry, episode=episode))
+
+        if to_import:
+            self.import_episodes(to_import, options["concurrency"], options["max_per_host"])
+
+        self.run_jobs()
+
+    def import_episodes(self, to_import: list[EntryImport], concurrency: int, max_per_host: int) -> int:
+        """
+        Media is downloaded by a thread pool, while episodes are saved in
+        this thread as their downloads finish, each in a transaction of its
+        own. To limit the amount of downloaded files waiting to be saved,
+        at most 2 * `concurrency` episodes are in progress at any time.
+        Returns the number of failed episodes.
+        """
+        started = time.monotonic()
+        queue = list(reversed(to_import))
+        futures: dict[Future, EntryImport] = {}
+        done = 0
+        failed = 0
+
+        self.stdout.write(f"Importing {len(to_import)} episodes, {concurrency} at a time ...")
+
+        with Downloader(max_per_host=max_per_host) as downloader, ThreadPoolExecutor(concurrency) as executor:
+            try:
+                while queue or futures:
+                    while queue and len(futures) < concurrency * 2:
+                        item = queue.pop()
+                        future = executor.submit(
+                            downloader.fetch_entry_media,
+                            item.entry,
+                            audio=item.audio,
+                            image=item.image,
+                        )
+                        futures[future] = item
+
+                    finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+
+                    for future in finished:
+                        item = futures.pop(future)
+                        done += 1
+                        try:
+                            media = future.result()
+                            item.episode.update_from_feed(item.entry, media)
+                            if media.failed_urls:
+                                failed += 1
+                                failed_urls = ", ".join(media.failed_urls)
+                                self.stderr.write(f"Could not download media for '{item.entry.title}': {failed_urls}")
+                        except Exception as e:
+                            failed += 1
+                            self.stderr.write(f"Failed to import '{item.entry.title}': {e!r}")
+                        self.write_progress(done, len(to_import), started, item.entry.title)
+            finally:
+                # If interrupted: don't start any more downloads, and get rid
+                # of the ones that won't be used.
+                for future in futures:
+                    future.cancel()
+                for future in futures:
+                    if not future.cancelled() and not future.exception():
+                        future.result().close()
+
+        if failed:
+            self.stderr.write(f"{failed} episode(s) failed.")
+        return failed
+
+    def run_jobs(self):
+        if spodcat_settings.RUN_JOBS_IN_PROCESS:
+            # Audio analysis has been queued. Finish it here, since
+            # in-process worker threads die with this command.
+            self.stdout.write("Processing queued jobs ...")
+            Worker().run(until_empty=True)
+        else:
+            self.stdout.write("Audio analysis has been queued, and will be done by the run_jobs command.")
+
+    def sync(self, url: str, slug: str, concurrency: int, max_per_host: int):
+        podcast = Podcast.objects.filter(slug=slug).first()
+
+        if podcast:
+            d = feedparser.parse(url, etag=podcast.feed_etag or None, modified=podcast.feed_last_modified or None)
+            if d.get("status") == 304:
+                self.stdout.write("Feed has not changed since the last sync.")
+                return
+        else:
+            self.stdout.write(f"Podcast {slug} does not exist - creating")
+            podcast = Podcast(slug=slug)
+            d = feedparser.parse(url)
+
+        if podcast.feed_hash != get_feed_hash(d.feed):
+            podcast.update_from_feed(d.feed)
+
+        entries = d.get("entries", [])
+        index = EpisodeIndex(podcast)
+        to_import: list[EntryImport] = []
+
+        for entry in entries:
+            episode = index.find(entry)
+            if episode is None:
+                to_import.append(EntryImport(entry=entry, episode=Episode(podcast=podcast)))
+            elif episode.feed_hash != get_feed_hash(entry):
+                to_import.append(EntryImport(
+                    entry=entry,
+                    episode=episode,
+                    audio=not episode.audio_file or episode.feed_audio_url != get_entry_audio_url(entry),
+                    image=not episode.image or episode.feed_image_url != get_entry_image_url(entry),
+                ))
+
+        self.stdout.write(
+            f"{len(entries)} entries found in feed, of which {len(to_import)} are new or changed."
+        )
+
+        failed = self.import_episodes(to_import, concurrency, max_per_host) if to_import else 0
+
+        # Failed entries would not be retried if the next sync got a 304.
+        if not failed:
+            podcast.feed_etag = d.get("etag", "")
+            podcast.feed_last_modified = d.get("modified", "")
+            podcast.save(update_fields=["feed_etag", "feed_last_modified"])
+
+    def write_progress(self, done: int, total: int, started: float, name: str):
+        elapsed = time.monotonic() - started
+        eta = datetime.timedelta(seconds=round(elapsed / done * (total - done)))
+        elapsed_delta = datetime.timedelta(seconds=round(elapsed))
+        self.stdout.write(f"[{done}/{total}] {name} done, elapsed {elapsed_delta}, ETA {eta}")
@@ -0,0 +1,22 @@
+from django.core.management import BaseCommand
+
+from spodcat.jobs import Worker
+
+
+class Command(BaseCommand):
+    help = "Runs queued background jobs, such as audio file processing. Keep it running, e.g. as a service."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Max number of jobs running at the same time. Defaults to the JOB_WORKERS setting.",
+        )
+        parser.add_argument("--once", action="store_true", help="Exit when there are no more queued jobs.")
+        parser.add_argument("--poll-interval", type=float, default=5.0, help="Seconds between queue polls.")
+
+    def handle(self, *args, **options):
+        worker = Worker(max_workers=options["workers"], poll_interval=options["poll_interval"])
+        self.stdout.write(f"Running jobs with {worker.max_workers} worker(s).")
+        worker.run(until_empty=options["once"])
@@ -0,0 +1,95 @@
+"""
+Maps stored audio file names to episodes, for logging of requests to
+locally served media (see spodcat.serve_media).
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass
+class MediaPaths:
+    loaded_at: float
+    paths: dict[str, str]
+    # Paths that weren't found when the index was loaded.
+    misses: set[str] = field(default_factory=set)
+
+
+class MediaPathIndex:
+    """
+    Audio file names of episodes and their renditions, mapped to episode
+    IDs. Loaded with one query per model, and reloaded when older than
+    `ttl` seconds, when an episode or rendition is saved or deleted in this
+    process, or when a path isn't found (at most every `miss_interval`
+    seconds, since files may have been added by other processes). Paths
+    that still aren't found, like images, are remembered until the next
+    reload, so they don't cause any more.
+
+    Lookups never wait for a reload, except when nothing is loaded (yet,
+    or since invalidate()).
+    """
+    def __init__(self, ttl: float = 300, miss_interval: float = 10):
+        self.current: MediaPaths | None = None
+        self.generation = 0
+        self.load_lock = threading.Lock()
+        self.miss_interval = miss_interval
+        self.ttl = ttl
+
+    def get_episode_id(self, path: str) -> str | None:
+        current = self.current
+
+        if current is None or time.monotonic() - current.loaded_at > self.ttl:
+            current = self.reload(current)
+        elif path in current.paths or path in current.misses:
+            return current.paths.get(path)
+        elif time.monotonic() - current.loaded_at > self.miss_interval:
+            current = self.reload(current)
+        else:
+            return None
+
+        episode_id = current.paths.get(path)
+        if episode_id is None:
+            current.misses.add(path)
+        return episode_id
+
+    def invalidate(self):
+        self.generation += 1
+        self.current = None
+
+    def load(self) -> dict[str, str]:
+        from spodcat.models import Episode, EpisodeRendition
+
+        paths = {}
+        for model in (EpisodeRendition, Episode):
+            names = (
+                model.objects.order_by()
+                .exclude(audio_file="").exclude(audio_file=None)
+                .values_list("audio_file", "episode_id" if model is EpisodeRendition else "pk")
+            )
+            paths.update({name: str(episode_id) for name, episode_id in names})
+        return paths
+
+    def reload(self, seen: MediaPaths | None) -> MediaPaths:
+        """
+        Loads the index, unless another thread has done so since `seen` was
+        current. If one is already loading it, returns the current index
+        right away, if there is one.
+        """
+        if not self.load_lock.acquire(blocking=self.current is None):
+            return self.current or self.reload(seen)
+        try:
+            if self.current is not None and self.current is not seen:
+                return self.current
+            generation = self.generation
+            paths = self.load()
+            # If invalidated while loading, the result may be outdated, so
+            # it's used this once and then reloaded. It's swapped in whole,
+            # so lookups see either the old index or the new one.
+            loaded_at = time.monotonic() if generation == self.generation else float("-inf")
+            self.current = MediaPaths(loaded_at=loaded_at, paths=paths)
+            return self.current
+        finally:
+            self.load_lock.release()
+
+
+media_path_index = MediaPathIndex()
@@ -0,0 +1,54 @@
+"""
+Cached storage URLs for episode audio, for the redirect endpoint in
+spodcat.views.media_redirect.
+"""
+from dataclasses import dataclass
+
+from django.core.cache import cache
+
+from spodcat.settings import spodcat_settings
+
+
+@dataclass
+class EpisodeAudioUrl:
+    length: int | None
+    url: str
+
+
+def get_cache_key(episode_id: str) -> str:
+    return f"spodcat:episode-audio-url:{episode_id}"
+
+
+def get_episode_audio_url(episode_id: str) -> EpisodeAudioUrl | None:
+    """
+    The storage URL of the episode's audio file, or None if there is no
+    such episode or it has no audio file. With object storages, these are
+    typically signed and time limited, and somewhat costly to generate, so
+    each one is kept in Django's default cache for MEDIA_REDIRECT_URL_TTL
+    seconds, which should therefore be shorter than the lifetime of the
+    storage's URLs. With a cache backend shared between processes, the
+    entry is dropped everywhere when the episode is saved or deleted.
+    """
+    key = get_cache_key(episode_id)
+    audio_url = cache.get(key)
+    if audio_url is not None:
+        return audio_url
+
+    from spodcat.models import Episode
+
+    episode = (
+        Episode.objects.non_polymorphic()
+        .filter(pk=episode_id)
+        .only("audio_file", "audio_file_length")
+        .first()
+    )
+    if episode is None or not episode.audio_file:
+        return None
+
+    audio_url = EpisodeAudioUrl(length=episode.audio_file_length, url=episode.audio_file.url)
+    cache.set(key, audio_url, spodcat_settings.MEDIA_REDIRECT_URL_TTL)
+    return audio_url
+
+
+def invalidate_episode_audio_url(episode_id: str):
+    cache.delete(get_cache_key(episode_id))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.3 on 2026-10-19 16:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+import spodcat.model_mixin
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spodcat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='attempts')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='created')),
+                ('error', models.TextField(blank=True, default='', verbose_name='error')),
+                ('finished', models.DateTimeField(default=None, null=True, verbose_name='finished')),
+                ('kwargs', models.JSONField(blank=True, default=dict, verbose_name='arguments')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=3, verbose_name='max attempts')),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='run after')),
+                ('started', models.DateTimeField(default=None, null=True, verbose_name='started')),
+                ('status', models.CharField(choices=[('queued', 'queued'), ('running', 'running'), ('done', 'done'), ('failed', 'failed')], default='queued', max_length=10, verbose_name='status')),
+                ('task', models.CharField(max_length=50, verbose_name='task')),
+                ('episode', models.ForeignKey(default=None, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='spodcat.episode', verbose_name='episode')),
+            ],
+            options={
+                'verbose_name': 'job',
+                'verbose_name_plural': 'jobs',
+                'ordering': ['-created'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='spodcat_job_status_idx')],
+            },
+            bases=(spodcat.model_mixin.ModelMixin, models.Model),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-19 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spodcat', '0002_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='episode',
+            name='loudness_lufs',
+            field=models.FloatField(blank=True, default=None, null=True, verbose_name='loudness (LUFS)'),
+        ),
+        migrations.AddField(
+            model_name='episode',
+            name='true_peak_dbfs',
+            field=models.FloatField(blank=True, default=None, null=True, verbose_name='true peak (dBFS)'),
+        ),
+    ]
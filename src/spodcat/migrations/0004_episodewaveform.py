@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-19 18:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import spodcat.model_mixin
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spodcat', '0003_episode_loudness'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EpisodeWaveform',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.BinaryField(verbose_name='data')),
+                ('resolution', models.PositiveIntegerField(verbose_name='resolution')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='updated')),
+                ('episode', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waveforms', to='spodcat.episode', verbose_name='episode')),
+            ],
+            options={
+                'verbose_name': 'episode waveform',
+                'verbose_name_plural': 'episode waveforms',
+                'ordering': ['resolution'],
+                'constraints': [models.UniqueConstraint(fields=('episode', 'resolution'), name='spodcat_episodewaveform_unique')],
+            },
+            bases=(spodcat.model_mixin.ModelMixin, models.Model),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-19 18:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import spodcat.model_mixin
+import spodcat.models.functions
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spodcat', '0004_episodewaveform'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EpisodeRendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('audio_file', models.FileField(max_length=300, storage=spodcat.models.functions.episode_audio_file_storage, upload_to=spodcat.models.functions.episode_rendition_upload_to, verbose_name='audio file')),
+                ('bit_rate', models.PositiveIntegerField(verbose_name='bit rate')),
+                ('content_type', models.CharField(max_length=100, verbose_name='content type')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='created')),
+                ('length', models.PositiveIntegerField(verbose_name='length')),
+                ('name', models.CharField(max_length=50, verbose_name='name')),
+                ('episode', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='spodcat.episode', verbose_name='episode')),
+            ],
+            options={
+                'verbose_name': 'episode rendition',
+                'verbose_name_plural': 'episode renditions',
+                'ordering': ['bit_rate'],
+                'constraints': [models.UniqueConstraint(fields=('episode', 'name'), name='spodcat_episoderendition_unique')],
+            },
+            bases=(spodcat.model_mixin.ModelMixin, models.Model),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.3 on 2026-10-19 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spodcat', '0005_episoderendition'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='episode',
+            name='feed_audio_url',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='episode',
+            name='feed_guid',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+        migrations.AddField(
+            model_name='episode',
+            name='feed_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='episode',
+            name='feed_image_url',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='podcast',
+            name='feed_etag',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='podcast',
+            name='feed_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='podcast',
+            name='feed_last_modified',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-19 20:45
+
+from django.db import migrations, models
+
+import spodcat.model_mixin
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('spodcat', '0006_feed_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='created')),
+                ('name', models.CharField(max_length=300, verbose_name='name')),
+                ('orphaned', models.DateTimeField(default=None, null=True, verbose_name='orphaned')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='reference count')),
+                ('sha256', models.CharField(max_length=64, verbose_name='SHA-256')),
+                ('size', models.PositiveBigIntegerField(verbose_name='size')),
+                ('storage_key', models.CharField(max_length=50, verbose_name='storage key')),
+            ],
+            options={
+                'verbose_name': 'media blob',
+                'verbose_name_plural': 'media blobs',
+                'indexes': [models.Index(fields=['storage_key', 'name'], name='spodcat_mediablob_name_idx'), models.Index(fields=['orphaned'], name='spodcat_mediablob_orphan_idx')],
+                'constraints': [models.UniqueConstraint(fields=('storage_key', 'sha256'), name='spodcat_mediablob_unique')],
+            },
+            bases=(spodcat.model_mixin.ModelMixin, models.Model),
+        ),
+    ]
@@ -4,8 +4,12 @@ from .challenge import Challenge
 from .comment import Comment
 from .episode import Episode
 from .episode_chapter import AbstractEpisodeChapter, EpisodeChapter
+from .episode_rendition import EpisodeRendition
 from .episode_song import EpisodeSong
+from .episode_waveform import EpisodeWaveform
 from .font_face import FontFace
+from .job import Job, JobStatus
+from .media_blob import MediaBlob
 from .podcast import Podcast
 from .podcast_content import PodcastContent
 from .podcast_link import PodcastLink
@@ -20,8 +24,13 @@ __all__ = [
     "Comment",
     "Episode",
     "EpisodeChapter",
+    "EpisodeRendition",
     "EpisodeSong",
+    "EpisodeWaveform",
     "FontFace",
+    "Job",
+    "JobStatus",
+    "MediaBlob",
     "Podcast",
     "PodcastContent",
     "PodcastLink",
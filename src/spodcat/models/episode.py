@@ -2,32 +2,31 @@ import datetime
 import locale
 import logging
 import mimetypes
-import os
-import tempfile
-from io import BytesIO
 from time import struct_time
 from typing import TYPE_CHECKING
 
 import feedparser
-import requests
 from django.core.exceptions import ValidationError
 from django.core.files import File
 from django.core.files.images import ImageFile
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
-from klaatu_python.utils import getitem0_nullable
 from markdownify import markdownify
-from pydub import AudioSegment
-from pydub.utils import mediainfo
 from slugify import slugify
 
+from spodcat.audio_analysis import AudioAnalysis, analyze_audio
+from spodcat.audio_probe import probe_audio_file
+from spodcat.feed_import import Downloader, get_entry_guid, get_feed_hash
+from spodcat.renditions import get_rendition_configs
+from spodcat.settings import spodcat_settings
 from spodcat.utils import (
     delete_storage_file,
     generate_thumbnail,
-    get_audio_file_dbfs_array,
-    get_audio_segment_dbfs_array,
+    local_file_path,
 )
 
+from .episode_rendition import EpisodeRendition
+from .episode_waveform import EpisodeWaveform
 from .functions import (
     episode_audio_file_storage,
     episode_audio_file_upload_to,
@@ -37,11 +36,14 @@ from .functions import (
     episode_image_upload_to,
 )
 from .podcast_content import PodcastContent
+from .querysets import EpisodeManager
 
 
 if TYPE_CHECKING:
     from django.db.models.manager import RelatedManager
 
+    from spodcat.feed_import import EntryMedia
+
     from .episode_chapter import EpisodeChapter
     from .episode_song import EpisodeSong
 
@@ -68,6 +70,13 @@ class Episode(PodcastContent):
     )
     dbfs_array = models.JSONField(blank=True, default=list, verbose_name=_("dBFS array"))
     duration_seconds = models.FloatField(blank=True, verbose_name=_("duration"), default=0.0, db_index=True)
+    # For episodes imported from an external feed: the enclosure and image
+    # URLs that audio_file and image were fetched from, the entry's GUID,
+    # and a hash of the entry's contents as of the last import.
+    feed_audio_url = models.TextField(blank=True, default="")
+    feed_guid = models.CharField(max_length=500, blank=True, default="")
+    feed_hash = models.CharField(max_length=64, blank=True, default="")
+    feed_image_url = models.TextField(blank=True, default="")
     image = models.ImageField(
         null=True,
         default=None,
@@ -91,11 +100,17 @@ class Episode(PodcastContent):
     image_thumbnail_mimetype = models.CharField(max_length=50, null=True, default=None)
     image_thumbnail_width = models.PositiveIntegerField(null=True, default=None)
     image_width = models.PositiveIntegerField(null=True, default=None)
+    loudness_lufs = models.FloatField(null=True, default=None, blank=True, verbose_name=_("loudness (LUFS)"))
     number = models.FloatField(null=True, default=None, blank=True, verbose_name=_("number"))
     season = models.PositiveSmallIntegerField(null=True, default=None, blank=True, verbose_name=_("season"))
+    true_peak_dbfs = models.FloatField(null=True, default=None, blank=True, verbose_name=_("true peak (dBFS)"))
 
     songs: "RelatedManager[EpisodeSong]"
     chapters: "RelatedManager[EpisodeChapter]"
+    renditions: "RelatedManager[EpisodeRendition]"
+    waveforms: "RelatedManager[EpisodeWaveform]"
+
+    objects = EpisodeManager()
 
     class Meta:
         verbose_name = _("episode")
@@ -130,6 +145,30 @@ class Episode(PodcastContent):
                 "audio_file": _("A non-draft episode must have an audio file. Upload a file or mark this as draft.")
             })
 
+    def apply_feed_media(self, media: "EntryMedia"):
+        if media.image:
+            delete_storage_file(self.image)
+            # pylint: disable=no-member
+            self.image.save(
+                name=f"{self.generate_filename_stem()}{media.image.suffix}",
+                content=ImageFile(file=media.image.file),
+                save=False,
+            )
+            self.handle_uploaded_image()
+            self.feed_image_url = media.image.url
+
+        if media.audio:
+            delete_storage_file(self.audio_file)
+            self.audio_content_type = media.audio.content_type
+            prefix, suffix = self.generate_audio_filename()
+            filename = f"{prefix}{suffix}"
+            logger.info("Saving audio file: %s", filename)
+            # pylint: disable=no-member
+            self.audio_file.save(name=filename, content=File(file=media.audio.file), save=False)
+            self.audio_file_length = media.audio.length
+            self.feed_audio_url = media.audio.url
+            self.probe_audio_file(File(file=media.audio.file, name=filename))
+
     def generate_audio_filename(self) -> tuple[str, str]:
         suffix = mimetypes.guess_extension(self.audio_content_type)
         if not suffix:
@@ -154,26 +193,37 @@ class Episode(PodcastContent):
 
         return name
 
-    # pylint: disable=no-member,consider-using-with
-    def get_dbfs_and_duration(self, temp_file: tempfile._TemporaryFileWrapper | None = None):
-        if temp_file is None:
-            _, extension = os.path.splitext(os.path.basename(self.audio_file.name))
-            temp_file = tempfile.NamedTemporaryFile(suffix=extension)
-            temp_file.write(self.audio_file.read())
-            temp_file.seek(0)
-
-        info = mediainfo(temp_file.name)
-        self.duration_seconds = float(info["duration"])
-        self.save(update_fields=["duration_seconds"])
-
-        audio: AudioSegment = AudioSegment.from_file(
-            file=temp_file.name,
-            format=info["format_name"],
-            codec=info["codec_name"],
-        )
-        temp_file.close()
-        self.dbfs_array = get_audio_segment_dbfs_array(audio)
-        self.save(update_fields=["dbfs_array"])
+    def generate_renditions(self):
+        """Transcodes the audio file as configured by AUDIO_RENDITIONS."""
+        configs = get_rendition_configs()
+
+        if configs:
+            # pylint: disable=no-member
+            with local_file_path(self.audio_file) as path:
+                for config in configs:
+                    EpisodeRendition.generate(self, path, config)
+
+        for rendition in self.renditions.exclude(name__in=[config.name for config in configs]):
+            rendition.delete()
+
+    def get_dbfs_and_duration(self):
+        # pylint: disable=no-member
+        with local_file_path(self.audio_file) as path:
+            analysis = analyze_audio(path)
+        self.set_audio_analysis(analysis)
+        self.save(update_fields=["dbfs_array", "duration_seconds", "loudness_lufs", "true_peak_dbfs"])
+        EpisodeWaveform.replace_for_episode(self, analysis.waveforms)
+
+    def get_audio_url(self) -> str | None:
+        """
+        The URL to publish for the audio file: with MEDIA_REDIRECT, the
+        redirect endpoint, otherwise the storage URL.
+        """
+        if not self.audio_file:
+            return None
+        if spodcat_settings.MEDIA_REDIRECT:
+            return spodcat_settings.get_absolute_backend_url("spodcat:episode-audio", args=(self.id,))
+        return self.audio_file.url
 
     # pylint: disable=no-member
     def handle_uploaded_image(self, save: bool = False):
@@ -196,7 +246,37 @@ class Episode(PodcastContent):
         if save:
             self.save()
 
-    def update_from_feed(self, entry: feedparser.FeedParserDict):
+    def probe_audio_file(self, file: File | None = None) -> bool:
+        """
+        Sets duration from the audio file's headers, which is a lot faster
+        than get_dbfs_and_duration(). Returns False if that didn't work.
+        """
+        # pylint: disable=no-member
+        info = probe_audio_file(file or self.audio_file)
+        if info is None:
+            return False
+        self.duration_seconds = info.duration_seconds
+        return True
+
+    def queue_audio_jobs(self):
+        from .job import Job
+
+        Job.enqueue("episode_audio_data", episode=self)
+        if get_rendition_configs():
+            Job.enqueue("episode_renditions", episode=self)
+
+    def set_audio_analysis(self, analysis: AudioAnalysis):
+        self.dbfs_array = analysis.dbfs_array
+        self.duration_seconds = analysis.duration_seconds
+        self.loudness_lufs = analysis.loudness_lufs
+        self.true_peak_dbfs = analysis.true_peak_dbfs
+
+    def update_from_feed(self, entry: feedparser.FeedParserDict, media: "EntryMedia | None" = None):
+        """
+        `media` is what Downloader.fetch_entry_media() got for `entry`; if
+        not given, it's fetched here. Either way, its files are closed
+        afterwards.
+        """
         try:
             self.number = int(entry.itunes_episode)
         except Exception:
@@ -208,6 +288,7 @@ class Episode(PodcastContent):
             pass
 
         self.name = markdownify(entry.title)
+        self.feed_guid = get_entry_guid(entry)[:500]
 
         if "description" in entry:
             self.description = markdownify(entry.description)
@@ -238,44 +319,22 @@ class Episode(PodcastContent):
                 except ValueError:
                     pass
 
-        if "image" in entry and "href" in entry.image and entry.image.href:
-            logger.info("Importing episode image: %s", entry.image.href)
-            response = requests.get(entry.image.href, timeout=10)
-            if response.ok:
-                suffix = ""
-                content_type = response.headers.get("Content-Type", "")
-                if content_type:
-                    suffix = mimetypes.guess_extension(content_type) or ("." + content_type.split("/")[-1])
-                delete_storage_file(self.image)
-                # pylint: disable=no-member
-                self.image.save(
-                    name=f"{self.generate_filename_stem()}{suffix}",
-                    content=ImageFile(file=BytesIO(response.content)),
-                    save=False,
-                )
-                self.handle_uploaded_image()
-
-        if "links" in entry:
-            link = getitem0_nullable(entry.links, lambda l: l.get("rel", "") == "enclosure")
-            if link and "href" in link:
-                logger.info("Fetching audio file: %s", link.href)
-                response = requests.get(link.href, timeout=60)
-                if response.ok:
-                    delete_storage_file(self.audio_file)
-                    self.audio_content_type = response.headers.get("Content-Type", "")
-                    prefix, suffix = self.generate_audio_filename()
-                    filename = f"{prefix}{suffix}"
-
-                    with tempfile.NamedTemporaryFile(suffix=suffix) as file:
-                        logger.info("Saving audio file: %s", filename)
-                        file.write(response.content)
-                        # pylint: disable=no-member
-                        self.audio_file.save(name=filename, content=File(file=file), save=False)
-                        info = mediainfo(file.name)
-                        self.duration_seconds = float(info["duration"])
-                        self.audio_file_length = len(response.content)
-                        file.seek(0)
-                        logger.info("Updating dBFS array for audio file")
-                        self.dbfs_array = get_audio_file_dbfs_array(file, info["format_name"])
-
-        self.save()
+        if media is None:
+            with Downloader() as downloader:
+                media = downloader.fetch_entry_media(entry)
+
+        # Otherwise, an incremental sync would consider the entry up to date
+        # and never retry the failed downloads.
+        if not media.failed_urls:
+            self.feed_hash = get_feed_hash(entry)
+
+        try:
+            with transaction.atomic():
+                self.apply_feed_media(media)
+                self.save()
+                if media.audio:
+                    # Waveform etc.; the duration from the header probe (or
+                    # the feed) will do until then.
+                    self.queue_audio_jobs()
+        finally:
+            media.close()
@@ -0,0 +1,75 @@
+import os
+import tempfile
+from typing import TYPE_CHECKING
+
+from django.core.files import File
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from spodcat.model_mixin import ModelMixin
+from spodcat.renditions import RenditionConfig, transcode
+from spodcat.utils import delete_storage_file
+
+from .functions import episode_audio_file_storage, episode_rendition_upload_to
+
+
+if TYPE_CHECKING:
+    from .episode import Episode
+
+
+class EpisodeRendition(ModelMixin, models.Model):
+    """
+    A transcoded version of an episode's audio file, advertised in the RSS
+    feed as a podcast:alternateEnclosure.
+    """
+    audio_file = models.FileField(
+        upload_to=episode_rendition_upload_to,
+        storage=episode_audio_file_storage,
+        verbose_name=_("audio file"),
+        max_length=300,
+    )
+    bit_rate = models.PositiveIntegerField(verbose_name=_("bit rate"))
+    content_type = models.CharField(max_length=100, verbose_name=_("content type"))
+    created = models.DateTimeField(auto_now_add=True, verbose_name=_("created"))
+    episode: "Episode" = models.ForeignKey(
+        "spodcat.Episode",
+        on_delete=models.CASCADE,
+        related_name="renditions",
+        verbose_name=_("episode"),
+    )
+    length = models.PositiveIntegerField(verbose_name=_("length"))
+    name = models.CharField(max_length=50, verbose_name=_("name"))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["episode", "name"], name="spodcat_episoderendition_unique"),
+        ]
+        ordering = ["bit_rate"]
+        verbose_name = _("episode rendition")
+        verbose_name_plural = _("episode renditions")
+
+    def __str__(self):
+        return f"{self.episode} ({self.name})"
+
+    @classmethod
+    def generate(cls, episode: "Episode", input_path: str, config: RenditionConfig) -> "EpisodeRendition":
+        rendition = cls.objects.filter(episode=episode, name=config.name).first() or cls(
+            episode=episode,
+            name=config.name,
+        )
+
+        with tempfile.NamedTemporaryFile(suffix=f".{config.extension}") as temp_file:
+            transcode(input_path, temp_file.name, config)
+            delete_storage_file(rendition.audio_file)
+            rendition.bit_rate = config.bit_rate
+            rendition.content_type = config.content_type
+            rendition.length = os.path.getsize(temp_file.name)
+            # pylint: disable=no-member
+            rendition.audio_file.save(
+                name=f"{episode.generate_filename_stem()}-{config.name}.{config.extension}",
+                content=File(file=temp_file),
+                save=False,
+            )
+
+        rendition.save()
+        return rendition
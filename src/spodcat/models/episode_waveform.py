@@ -0,0 +1,50 @@
+from typing import TYPE_CHECKING
+
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from spodcat.model_mixin import ModelMixin
+from spodcat.waveform import pack_dbfs_values
+
+
+if TYPE_CHECKING:
+    from .episode import Episode
+
+
+class EpisodeWaveform(ModelMixin, models.Model):
+    """
+    Normalized dBFS values for an episode's audio at one resolution, one
+    unsigned byte (0-255) per bucket. Kept out of the Episode table so they
+    aren't loaded with it, and served as-is by the waveform endpoint.
+    """
+    data = models.BinaryField(verbose_name=_("data"))
+    episode: "Episode" = models.ForeignKey(
+        "spodcat.Episode",
+        on_delete=models.CASCADE,
+        related_name="waveforms",
+        verbose_name=_("episode"),
+    )
+    resolution = models.PositiveIntegerField(verbose_name=_("resolution"))
+    updated = models.DateTimeField(auto_now=True, verbose_name=_("updated"))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["episode", "resolution"], name="spodcat_episodewaveform_unique"),
+        ]
+        ordering = ["resolution"]
+        verbose_name = _("episode waveform")
+        verbose_name_plural = _("episode waveforms")
+
+    def __str__(self):
+        return f"{self.episode} ({self.resolution})"
+
+    @classmethod
+    def replace_for_episode(cls, episode: "Episode", waveforms: dict[int, list[float]]):
+        """`waveforms` are normalized dBFS arrays keyed by resolution."""
+        cls.objects.filter(episode=episode).exclude(resolution__in=waveforms).delete()
+        for resolution, values in waveforms.items():
+            cls.objects.update_or_create(
+                episode=episode,
+                resolution=resolution,
+                defaults={"data": pack_dbfs_values(values)},
+            )
@@ -1,15 +1,19 @@
 from typing import TYPE_CHECKING
 
 from django.conf import settings
-from django.core.files.storage import default_storage, storages
+from django.core.files.storage import Storage, default_storage, storages
 from django.core.signals import setting_changed
 from django.utils.module_loading import import_string
 
+from spodcat.settings import spodcat_settings
+from spodcat.storage import DeduplicatingStorage, UrlCachingStorage, url_cache
+
 
 if TYPE_CHECKING:
     from spodcat.models import (
         AbstractEpisodeChapter,
         Episode,
+        EpisodeRendition,
         FontFace,
         Podcast,
         PodcastLink,
@@ -38,16 +42,16 @@ def __reload(*args, **kwargs):
     setting = kwargs["setting"]
     if setting == "SPODCAT":
         __user_functions.clear()
+        url_cache.clear()
 
 
-def __get_storage(key: str):
-    if key not in __user_storages:
-        filefield_conf = getattr(settings, "SPODCAT", {}).get("FILEFIELDS", {}).get(key, {})
-        user_storage = filefield_conf.get("STORAGE", None)
-        if isinstance(user_storage, str):
-            user_storage = storages[user_storage]
-        __user_storages[key] = user_storage
-    return __user_storages[key] or default_storage
+def __get_storage(key: str) -> Storage:
+    # Always wrapped, since UrlCachingStorage checks MEDIA_URL_CACHE_TTL on
+    # every call.
+    storage = get_base_storage(key)
+    if spodcat_settings.DEDUPLICATE_MEDIA:
+        storage = DeduplicatingStorage(storage, key)
+    return UrlCachingStorage(storage)
 
 
 def __get_upload_to(key: str, *args, **kwargs):
@@ -98,6 +102,11 @@ def episode_image_storage():
     return __get_storage("EPISODE_IMAGE")
 
 
+def episode_rendition_upload_to(instance: "EpisodeRendition", filename: str):
+    return __get_upload_to("EPISODE_RENDITION", instance, filename) or \
+        f"{instance.episode.podcast.slug}/episodes/renditions/{filename}"
+
+
 def fontface_file_upload_to(instance: "FontFace", filename: str):
     return __get_upload_to("FONTFACE_FILE", instance, filename) or f"fonts/{filename}"
 
@@ -106,6 +115,17 @@ def fontface_file_storage():
     return __get_storage("FONTFACE_FILE")
 
 
+def get_base_storage(key: str) -> Storage:
+    """The configured storage for `key`, without deduplication."""
+    if key not in __user_storages:
+        filefield_conf = getattr(settings, "SPODCAT", {}).get("FILEFIELDS", {}).get(key, {})
+        user_storage = filefield_conf.get("STORAGE", None)
+        if isinstance(user_storage, str):
+            user_storage = storages[user_storage]
+        __user_storages[key] = user_storage
+    return __user_storages[key] or default_storage
+
+
 def podcast_banner_upload_to(instance: "Podcast", filename: str):
     return __get_upload_to("PODCAST_BANNER", instance, filename) or f"{instance.slug}/images/{filename}"
 
@@ -0,0 +1,159 @@
+import datetime
+import logging
+import traceback
+from typing import TYPE_CHECKING
+
+from django.db import connections, models, router, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from spodcat.model_mixin import ModelMixin
+
+from .querysets import JobQuerySet
+
+
+if TYPE_CHECKING:
+    from .episode import Episode
+    from .querysets import JobManager
+
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus(models.TextChoices):
+    QUEUED = "queued", _("queued")
+    RUNNING = "running", _("running")
+    DONE = "done", _("done")
+    FAILED = "failed", _("failed")
+
+
+class Job(ModelMixin, models.Model):
+    """
+    A background task, e.g. audio post-processing for an episode. Run by
+    the `run_jobs` management command, or in-process if RUN_JOBS_IN_PROCESS
+    is set. Tasks are registered in spodcat.jobs and should be idempotent,
+    since failed jobs are retried.
+    """
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name=_("attempts"))
+    created = models.DateTimeField(auto_now_add=True, verbose_name=_("created"))
+    episode: "Episode | None" = models.ForeignKey(
+        "spodcat.Episode",
+        on_delete=models.CASCADE,
+        null=True,
+        default=None,
+        related_name="jobs",
+        verbose_name=_("episode"),
+    )
+    error = models.TextField(blank=True, default="", verbose_name=_("error"))
+    finished = models.DateTimeField(null=True, default=None, verbose_name=_("finished"))
+    kwargs = models.JSONField(blank=True, default=dict, verbose_name=_("arguments"))
+    max_attempts = models.PositiveSmallIntegerField(default=3, verbose_name=_("max attempts"))
+    run_after = models.DateTimeField(default=timezone.now, verbose_name=_("run after"))
+    started = models.DateTimeField(null=True, default=None, verbose_name=_("started"))
+    status = models.CharField(
+        max_length=10,
+        choices=JobStatus.choices,
+        default=JobStatus.QUEUED,
+        verbose_name=_("status"),
+    )
+    task = models.CharField(max_length=50, verbose_name=_("task"))
+
+    objects: "JobManager" = JobQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["-created"]
+        indexes = [models.Index(fields=["status", "run_after"], name="spodcat_job_status_idx")]
+        verbose_name = _("job")
+        verbose_name_plural = _("jobs")
+
+    def __str__(self):
+        return f"{self.task} ({self.episode})" if self.episode else self.task
+
+    @classmethod
+    def claim(cls) -> "Job | None":
+        """
+        Marks the oldest runnable job as running and returns it. Safe to call
+        from concurrent workers.
+        """
+        using = router.db_for_write(cls)
+        skip_locked = connections[using].features.has_select_for_update_skip_locked
+
+        with transaction.atomic(using=using):
+            job = (
+                cls.objects
+                .select_for_update(skip_locked=skip_locked)
+                .filter(status=JobStatus.QUEUED, run_after__lte=timezone.now())
+                .order_by("run_after", "pk")
+                .first()
+            )
+            if job is None:
+                return None
+
+            # Backends without SELECT ... FOR UPDATE SKIP LOCKED rely on
+            # this conditional update instead.
+            started = timezone.now()
+            claimed = cls.objects.filter(pk=job.pk, status=JobStatus.QUEUED).update(
+                attempts=models.F("attempts") + 1,
+                started=started,
+                status=JobStatus.RUNNING,
+            )
+            if not claimed:
+                return None
+
+        job.refresh_from_db()
+        return job
+
+    @classmethod
+    def enqueue(cls, task: str, episode: "Episode | None" = None, max_attempts: int = 3, **kwargs) -> "Job":
+        """
+        Queues a task, unless an identical one is already queued. The
+        in-process worker, if enabled, is started when the transaction
+        commits.
+        """
+        from spodcat.jobs import get_task, start_in_process_worker
+
+        get_task(task)
+        job = cls.objects.filter(task=task, episode=episode, kwargs=kwargs, status=JobStatus.QUEUED).first()
+
+        if job is None:
+            job = cls.objects.create(task=task, episode=episode, kwargs=kwargs, max_attempts=max_attempts)
+
+        transaction.on_commit(start_in_process_worker)
+        return job
+
+    def fail(self, exception: BaseException):
+        self.error = "".join(traceback.format_exception(exception))
+
+        if self.attempts < self.max_attempts:
+            # Exponential backoff: 1, 2, 4 ... minutes.
+            self.run_after = timezone.now() + datetime.timedelta(minutes=2 ** (self.attempts - 1))
+            self.status = JobStatus.QUEUED
+            logger.warning("Job %s failed (attempt %d), will retry", self, self.attempts, exc_info=exception)
+        else:
+            self.finished = timezone.now()
+            self.status = JobStatus.FAILED
+            logger.error("Job %s failed (attempt %d), giving up", self, self.attempts, exc_info=exception)
+
+        self.save(update_fields=["error", "finished", "run_after", "status"])
+
+    def retry(self):
+        self.attempts = 0
+        self.error = ""
+        self.finished = None
+        self.run_after = timezone.now()
+        self.started = None
+        self.status = JobStatus.QUEUED
+        self.save()
+
+    def run(self):
+        from spodcat.jobs import get_task
+
+        try:
+            get_task(self.task)(self)
+        except Exception as e:
+            self.fail(e)
+        else:
+            self.error = ""
+            self.finished = timezone.now()
+            self.status = JobStatus.DONE
+            self.save(update_fields=["error", "finished", "status"])
@@ -0,0 +1,135 @@
+import datetime
+import hashlib
+import logging
+
+from django.core.files import File
+from django.core.files.storage import Storage
+from django.db import models, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from spodcat.model_mixin import ModelMixin
+from spodcat.storage import get_blob_name
+
+
+logger = logging.getLogger(__name__)
+
+# Orphaned blobs are kept at least this long, in case they are referenced
+# again, e.g. when an upload is replaced by the same file.
+GC_MIN_AGE = datetime.timedelta(hours=1)
+
+
+class MediaBlob(ModelMixin, models.Model):
+    """
+    A stored file, named after the SHA-256 of its contents, and the number
+    of file fields referencing it. Used when DEDUPLICATE_MEDIA is on (see
+    spodcat.storage). Blobs that are no longer referenced are deleted by
+    collect_garbage().
+    """
+    created = models.DateTimeField(auto_now_add=True, verbose_name=_("created"))
+    name = models.CharField(max_length=300, verbose_name=_("name"))
+    orphaned = models.DateTimeField(null=True, default=None, verbose_name=_("orphaned"))
+    ref_count = models.PositiveIntegerField(default=0, verbose_name=_("reference count"))
+    sha256 = models.CharField(max_length=64, verbose_name=_("SHA-256"))
+    size = models.PositiveBigIntegerField(verbose_name=_("size"))
+    storage_key = models.CharField(max_length=50, verbose_name=_("storage key"))
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["storage_key", "sha256"], name="spodcat_mediablob_unique"),
+        ]
+        indexes = [
+            models.Index(fields=["storage_key", "name"], name="spodcat_mediablob_name_idx"),
+            models.Index(fields=["orphaned"], name="spodcat_mediablob_orphan_idx"),
+        ]
+        verbose_name = _("media blob")
+        verbose_name_plural = _("media blobs")
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def add_reference(cls, storage_key: str, storage: Storage, name: str, content: File) -> str:
+        """
+        Returns the name of the blob with `content` in `storage`, which is
+        uploaded unless it's already there. `name` is only used for its
+        file extension.
+        """
+        hasher = hashlib.sha256()
+        size = 0
+        for chunk in content.chunks():
+            hasher.update(chunk)
+            size += len(chunk)
+        sha256 = hasher.hexdigest()
+        blob_name = get_blob_name(sha256, name)
+
+        with transaction.atomic():
+            # The lock keeps collect_garbage() from deleting the file while
+            # we're adding a reference to it.
+            blob, _ = cls.objects.select_for_update().get_or_create(
+                storage_key=storage_key,
+                sha256=sha256,
+                defaults={"name": blob_name, "size": size},
+            )
+            if not storage.exists(blob.name):
+                content.seek(0)
+                blob.name = storage.save(blob.name, content)
+            else:
+                logger.info("%s already stored as %s, skipping upload", name, blob.name)
+            blob.orphaned = None
+            blob.ref_count += 1
+            blob.save()
+
+        return blob.name
+
+    @classmethod
+    def collect_garbage(cls, min_age: datetime.timedelta = GC_MIN_AGE) -> int:
+        """
+        Deletes blobs that have been unreferenced for at least `min_age`,
+        and their files. Returns the number of deleted blobs.
+        """
+        from .functions import get_base_storage
+
+        deleted = 0
+        threshold = timezone.now() - min_age
+        pks = list(cls.objects.filter(ref_count=0, orphaned__lte=threshold).values_list("pk", flat=True))
+
+        for pk in pks:
+            with transaction.atomic():
+                blob = cls.objects.select_for_update().filter(pk=pk, ref_count=0).first()
+                if blob is None:
+                    continue
+                get_base_storage(blob.storage_key).delete(blob.name)
+                blob.delete()
+                deleted += 1
+
+        return deleted
+
+    @classmethod
+    def release(cls, storage_key: str, name: str) -> bool:
+        """
+        Removes a reference to the blob called `name`. Returns False if
+        there is no such blob, i.e. the file was stored before
+        deduplication was turned on.
+        """
+        with transaction.atomic():
+            blob = cls.objects.select_for_update().filter(storage_key=storage_key, name=name).first()
+            if blob is None:
+                return False
+            if blob.ref_count > 0:
+                blob.ref_count -= 1
+            if blob.ref_count == 0:
+                blob.orphaned = timezone.now()
+                transaction.on_commit(cls.schedule_garbage_collection)
+            blob.save(update_fields=["orphaned", "ref_count"])
+
+        return True
+
+    @classmethod
+    def schedule_garbage_collection(cls):
+        # Collects blobs orphaned at least GC_MIN_AGE ago, so not
+        # necessarily this one; the gc_media_blobs command can be run
+        # periodically to get the rest.
+        from .job import Job
+
+        Job.enqueue("gc_media_blobs")
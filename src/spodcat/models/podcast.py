@@ -1,14 +1,11 @@
 import logging
-import mimetypes
 import re
 import uuid
 from base64 import b64encode
-from io import BytesIO
 from typing import TYPE_CHECKING
 from urllib.parse import urljoin
 
 import feedparser
-import requests
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
@@ -21,6 +18,7 @@ from markdown import markdown
 from markdownify import markdownify
 from martor.models import MartorField
 
+from spodcat.feed_import import IMAGE_TIMEOUT, Downloader, get_feed_hash
 from spodcat.markdown import MarkdownExtension
 from spodcat.model_mixin import ModelMixin
 from spodcat.models.querysets import PodcastQuerySet
@@ -126,6 +124,11 @@ class Podcast(ModelMixin, models.Model):
         max_length=300,
     )
     favicon_content_type = models.CharField(null=True, default=None, blank=True, max_length=50)
+    # Cache validators and a hash of the channel data of the external feed
+    # last imported into this podcast, for import_rss --sync.
+    feed_etag = models.CharField(max_length=200, blank=True, default="")
+    feed_hash = models.CharField(max_length=64, blank=True, default="")
+    feed_last_modified = models.CharField(max_length=100, blank=True, default="")
     language = models.CharField(
         max_length=5,
         choices=get_language_choices,
@@ -258,26 +261,21 @@ class Podcast(ModelMixin, models.Model):
         from spodcat.models import Category
 
         self.name = markdownify(feed.title)
+        self.feed_hash = get_feed_hash(feed)
 
         if "description" in feed:
             self.description = markdownify(feed.description)
 
         if "image" in feed and "href" in feed.image and feed.image.href:
             logger.info("Importing cover image: %s", feed.image.href)
-            response = requests.get(feed.image.href, timeout=10)
-            if response.ok:
-                suffix = ""
-                content_type = response.headers.get("Content-Type", "")
-                if content_type:
-                    suffix = mimetypes.guess_extension(content_type) or ("." + content_type.split("/")[-1])
-                delete_storage_file(self.cover)
-                # pylint: disable=no-member
-                self.cover.save(
-                    name=f"cover{suffix}",
-                    content=ImageFile(file=BytesIO(response.content)),
-                    save=False,
-                )
-                self.handle_uploaded_cover()
+            with Downloader() as downloader:
+                cover = downloader.get(feed.image.href, IMAGE_TIMEOUT)
+            if cover:
+                with cover.file:
+                    delete_storage_file(self.cover)
+                    # pylint: disable=no-member
+                    self.cover.save(name=f"cover{cover.suffix}", content=ImageFile(file=cover.file), save=False)
+                    self.handle_uploaded_cover()
 
         if "language" in feed:
             self.language = feed.language
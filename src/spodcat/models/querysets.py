@@ -1,18 +1,43 @@
+import datetime
 from typing import TYPE_CHECKING, TypeVar
 
-from django.db.models import Exists, Max, OuterRef, Q, QuerySet
+from django.db.models import Exists, F, Max, OuterRef, Q, QuerySet
 from django.utils.timezone import localdate, now
+from polymorphic.managers import PolymorphicManager
 from polymorphic.query import PolymorphicQuerySet
 
 
 if TYPE_CHECKING:
     from django.contrib.auth.models import AbstractUser, AnonymousUser
 
-    from spodcat.models import Podcast, PodcastContent
+    from spodcat.models import Episode, Job, Podcast, PodcastContent
 
     _T = TypeVar("_T", bound=PodcastContent)
 
 
+class JobQuerySet(QuerySet["Job"]):
+    def requeue_stale(self, older_than: datetime.timedelta) -> int:
+        """
+        Puts jobs that have been running for longer than `older_than` back in
+        the queue, e.g. after a worker was killed. Jobs that have used up
+        their attempts are marked as failed instead, so a job that keeps
+        killing its worker isn't retried forever. Returns the number of
+        requeued jobs.
+        """
+        from spodcat.models.job import JobStatus
+
+        stale = self.filter(status=JobStatus.RUNNING, started__lt=now() - older_than)
+        stale.filter(attempts__gte=F("max_attempts")).update(
+            error="Timed out, or the worker running it died.",
+            finished=now(),
+            status=JobStatus.FAILED,
+        )
+        return stale.filter(attempts__lt=F("max_attempts")).update(
+            status=JobStatus.QUEUED,
+            run_after=now(),
+        )
+
+
 class PodcastQuerySet(QuerySet["Podcast"]):
     def filter_by_user(self, user: "AnonymousUser | AbstractUser"):
         if user.is_superuser:
@@ -69,9 +94,31 @@ class PodcastContentQuerySet(PolymorphicQuerySet["_T"]):
         return self.annotate(has_songs=Exists(EpisodeSong.objects.filter(episode=OuterRef("pk"))))
 
 
+class EpisodeQuerySet(PodcastContentQuerySet["Episode"]):
+    # Deferred by EpisodeManager, since most code never reads them.
+    heavy_fields = ("dbfs_array", "description")
+
+    def with_heavy_fields(self, *fields: str):
+        """
+        Loads all heavy fields, or only `fields` among them. Clears any
+        other deferrals too, so call it before only() or defer().
+        """
+        queryset = self.defer(None)
+        if fields:
+            return queryset.defer(*[f for f in self.heavy_fields if f not in fields])
+        return queryset
+
+
+class EpisodeManager(PolymorphicManager.from_queryset(EpisodeQuerySet)):
+    def get_queryset(self) -> "PodcastContentQuerySet[Episode]":
+        return super().get_queryset().defer(*EpisodeQuerySet.heavy_fields)
+
+
 if TYPE_CHECKING:
     from django.db.models.manager import Manager
-    from polymorphic.managers import PolymorphicManager
+
+    class JobManager(Manager[Job], JobQuerySet):
+        ...
 
     class PodcastContentManager(PolymorphicManager[_T], PodcastContentQuerySet[_T]):
         ...
@@ -48,6 +48,7 @@ class Podcast2Extension(BaseExtension):
 
 class Podcast2EntryExtension(BaseEntryExtension):
     def __init__(self):
+        self.__podcast_alternate_enclosures: list[dict] = []
         self.__podcast_chapters_url = None
         self.__podcast_chapters_type = None
         self.__podcast_season = None
@@ -57,6 +58,19 @@ class Podcast2EntryExtension(BaseEntryExtension):
         self.__podcast_images: list[tuple[str, int]] = []
 
     def extend_rss(self, feed):
+        for enclosure in self.__podcast_alternate_enclosures:
+            elem = xml_elem("{%s}alternateEnclosure" % NAMESPACE, feed)
+            elem.attrib["type"] = enclosure["type"]
+            elem.attrib["length"] = str(enclosure["length"])
+            if enclosure["bitrate"]:
+                elem.attrib["bitrate"] = str(enclosure["bitrate"])
+            if enclosure["title"]:
+                elem.attrib["title"] = enclosure["title"]
+            if enclosure["default"]:
+                elem.attrib["default"] = "true"
+            source = xml_elem("{%s}source" % NAMESPACE, elem)
+            source.attrib["uri"] = enclosure["url"]
+
         if self.__podcast_chapters_url:
             chapters = xml_elem("{%s}chapters" % NAMESPACE, feed)
             chapters.attrib["url"] = self.__podcast_chapters_url
@@ -82,6 +96,24 @@ class Podcast2EntryExtension(BaseEntryExtension):
 
         return feed
 
+    def podcast_alternate_enclosure(
+        self,
+        url: str,
+        type_: str,
+        length: int,
+        bitrate: int | None = None,
+        title: str | None = None,
+        default: bool = False,
+    ):
+        self.__podcast_alternate_enclosures.append({
+            "bitrate": bitrate,
+            "default": default,
+            "length": length,
+            "title": title,
+            "type": type_,
+            "url": url,
+        })
+
     def podcast_chapters(self, url: str | None = None, type_: str | None = None):
         if url is not None:
             self.__podcast_chapters_url = url
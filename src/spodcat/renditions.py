@@ -0,0 +1,48 @@
+"""
+Transcoding of episode audio into (typically lower bitrate) renditions, as
+configured by the AUDIO_RENDITIONS setting. See EpisodeRendition.
+"""
+import subprocess
+from dataclasses import dataclass
+
+from pydub import AudioSegment
+
+from spodcat.settings import spodcat_settings
+
+
+@dataclass
+class RenditionConfig:
+    name: str
+    # ffmpeg encoder and muxer names, e.g. "libopus" and "ogg".
+    codec: str
+    container: str
+    content_type: str
+    extension: str
+    bit_rate: int = 64000
+    channels: int = 1
+
+
+def get_rendition_configs() -> list[RenditionConfig]:
+    return [RenditionConfig(**conf) for conf in spodcat_settings.AUDIO_RENDITIONS]
+
+
+def transcode(input_path: str, output_path: str, config: RenditionConfig):
+    command = [
+        AudioSegment.converter,
+        "-nostdin",
+        "-v", "error",
+        "-y",
+        "-i", input_path,
+        "-map", "0:a:0",
+        "-c:a", config.codec,
+        "-b:a", str(config.bit_rate),
+        "-ac", str(config.channels),
+        # So MP4 files can be played before they are fully downloaded.
+        *(["-movflags", "+faststart"] if config.container in ("ipod", "mp4") else []),
+        "-f", config.container,
+        output_path,
+    ]
+    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=False)
+
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with code {result.returncode}: {result.stderr.decode(errors='replace')}")
@@ -14,6 +14,7 @@ class EpisodeSerializer(serializers.ModelSerializer):
     comments = ResourceRelatedField(queryset=Comment.objects, many=True)
     description_html = serializers.SerializerMethodField()
     has_songs = serializers.SerializerMethodField()
+    renditions = serializers.SerializerMethodField()
     songs = PolymorphicResourceRelatedField(
         EpisodeSongSerializer,
         queryset=EpisodeSong.objects,
@@ -27,11 +28,19 @@ class EpisodeSerializer(serializers.ModelSerializer):
     }
 
     class Meta:
-        exclude = ["polymorphic_ctype"]
+        exclude = [
+            "feed_audio_url",
+            "feed_guid",
+            "feed_hash",
+            "feed_image_url",
+            "loudness_lufs",
+            "polymorphic_ctype",
+            "true_peak_dbfs",
+        ]
         model = Episode
 
     def get_audio_url(self, obj: Episode):
-        return obj.audio_file.url if obj.audio_file else None
+        return obj.get_audio_url()
 
     def get_description_html(self, obj: Episode):
         return obj.description_html
@@ -41,6 +50,18 @@ class EpisodeSerializer(serializers.ModelSerializer):
             return getattr(obj, "has_songs")
         return obj.songs.exists()
 
+    def get_renditions(self, obj: Episode):
+        return [
+            {
+                "bit_rate": rendition.bit_rate,
+                "content_type": rendition.content_type,
+                "length": rendition.length,
+                "name": rendition.name,
+                "url": rendition.audio_file.url,
+            }
+            for rendition in obj.renditions.all()
+        ]
+
 
 class PartialEpisodeSerializer(EpisodeSerializer):
     class Meta:
@@ -28,7 +28,7 @@ class PodcastSerializer(serializers.ModelSerializer):
     }
 
     class Meta:
-        exclude = ["authors", "owner"]
+        exclude = ["authors", "feed_etag", "feed_hash", "feed_last_modified", "owner"]
         model = Podcast
 
     def get_description_html(self, obj: Podcast) -> str:
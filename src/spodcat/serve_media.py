@@ -1,43 +1,342 @@
 import mimetypes
+import os
 import posixpath
 import re
-from io import BytesIO
+import uuid
 from pathlib import Path
+from typing import IO, Callable, Iterator
+from urllib.parse import quote
 
-from django.http import FileResponse, HttpResponseNotFound
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseNotFound,
+    StreamingHttpResponse,
+)
+from django.utils import timezone
 from django.utils._os import safe_join
-from django.views.static import serve
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from spodcat.logs.writer import log_audio_request
+from spodcat.media_paths import media_path_index
+from spodcat.settings import spodcat_settings
+from spodcat.storage import get_blob_sha256
+
+
+BLOCK_SIZE = 64 * 1024
+# More ranges than this in one request are most likely abuse.
+MAX_RANGES = 20
+RANGE_SPEC_RE = re.compile(r"^(\d*)-(\d*)$")
+
+
+class FileWindow:
+    """
+    A read-only view of `length` bytes of `file`, starting at `start`. Since
+    the underlying file is positioned at the start of the window, and
+    fileno() is exposed, servers that use os.sendfile() for
+    wsgi.file_wrapper (with the Content-Length set to `length`) can send it
+    without it passing through Python.
+
+    `on_close` is called with the number of bytes sent when the window is
+    closed. If fileno() has been called, we assume the server sent the
+    whole window with sendfile; otherwise it's the number of bytes read.
+    """
+    def __init__(
+        self,
+        file: IO[bytes],
+        start: int,
+        length: int,
+        on_close: Callable[[int], None] | None = None,
+    ):
+        self.bytes_read = 0
+        self.file = file
+        self.length = length
+        self.name = file.name
+        self.on_close = on_close
+        self.remaining = length
+        self.used_fileno = False
+        file.seek(start)
+
+    def close(self):
+        self.file.close()
+        if self.on_close:
+            on_close, self.on_close = self.on_close, None
+            on_close(self.length if self.used_fileno else self.bytes_read)
+
+    def fileno(self) -> int:
+        self.used_fileno = True
+        return self.file.fileno()
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.bytes_read += len(data)
+        self.remaining -= len(data)
+        return data
+
+
+def delegate_to_server(fullpath: Path, path: str) -> HttpResponse | None:
+    """
+    If the MEDIA_SENDFILE setting is set, returns an empty response telling
+    the web server in front of us to send the file itself (including
+    handling of Range and conditional requests).
+    """
+    mode = spodcat_settings.MEDIA_SENDFILE
+    if not mode:
+        return None
+
+    content_type, encoding = get_content_type(fullpath)
+    response = HttpResponse(content_type=content_type)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+
+    if mode == "x-accel-redirect":
+        # Nginx: the prefix should be an `internal` location aliased to
+        # MEDIA_ROOT.
+        response["X-Accel-Redirect"] = spodcat_settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + quote(path)
+    elif mode == "x-sendfile":
+        # Apache (mod_xsendfile), lighttpd: the absolute path.
+        response["X-Sendfile"] = str(fullpath.resolve())
+    else:
+        raise ValueError(f"Invalid MEDIA_SENDFILE value: {mode}")
+
+    return response
+
+
+def get_content_type(path: Path) -> tuple[str, str | None]:
+    content_type, encoding = mimetypes.guess_type(str(path))
+    return content_type or "application/octet-stream", encoding
+
+
+def get_etag(path: str, stat: os.stat_result) -> str:
+    """
+    The content hash for content-addressed files; otherwise, like nginx,
+    hex encoded modification time and size.
+    """
+    sha256 = get_blob_sha256(path)
+    if sha256:
+        return quote_etag(sha256)
+    return quote_etag(f"{int(stat.st_mtime):x}-{stat.st_size:x}")
+
+
+def get_log_callback(
+    request,
+    path: str,
+    status_code: int,
+    range_start: int | None,
+) -> Callable[[int], None] | None:
+    """
+    If LOG_AUDIO_REQUESTS is on and `path` is an episode's audio file (or
+    a rendition of it), returns a function that queues a
+    PodcastEpisodeAudioRequestLog for the request, given the number of
+    bytes sent.
+    """
+    if not spodcat_settings.LOG_AUDIO_REQUESTS:
+        return None
+
+    episode_id = media_path_index.get_episode_id(path)
+    if episode_id is None:
+        return None
+
+    started = timezone.now()
+
+    def callback(bytes_sent: int):
+        log_audio_request(request, episode_id, started, status_code, range_start, bytes_sent)
+
+    return callback
+
+
+def if_range_matches(request, etag: str, mtime: float) -> bool:
+    """
+    True if there is no If-Range header, or it matches the file's current
+    ETag or Last-Modified (i.e. the client's partial copy is still valid).
+    If-Range requires strong validators, so weak ETags never match, and
+    dates must match exactly.
+    """
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith(("W/", '"')):
+        return if_range == etag
+    return if_range == http_date(mtime)
+
+
+def iterate_multipart(
+    path: Path,
+    ranges: list[tuple[int, int]],
+    parts: list[bytes],
+    closing: bytes,
+    on_close: Callable[[int], None] | None = None,
+) -> Iterator[bytes]:
+    bytes_sent = 0
+
+    try:
+        with path.open("rb") as f:
+            for (start, end), part_header in zip(ranges, parts):
+                yield part_header
+                window = FileWindow(f, start, end - start + 1)
+                while chunk := window.read(BLOCK_SIZE):
+                    yield chunk
+                    bytes_sent += len(chunk)
+                yield b"\r\n"
+        yield closing
+    finally:
+        # Also run if the client disconnects and the response is closed
+        # early.
+        if on_close:
+            on_close(bytes_sent)
+
+
+def parse_range_header(header: str, size: int) -> list[tuple[int, int]] | None:
+    """
+    Parses a Range header into a list of (start, end) tuples, with
+    inclusive end offsets, clamped to `size`. Unsatisfiable ranges are left
+    out, so an empty list means a 416 response is in order. Returns None if
+    the header is invalid or uses another unit than bytes, in which case
+    it should be ignored.
+    """
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs:
+        return None
+
+    ranges: list[tuple[int, int]] = []
+
+    for spec in specs.split(","):
+        m = RANGE_SPEC_RE.match(spec.strip())
+        if not m or not (m.group(1) or m.group(2)):
+            return None
+        if not m.group(1):
+            # Suffix range: the last N bytes.
+            suffix_length = int(m.group(2))
+            if suffix_length > 0 and size > 0:
+                ranges.append((max(size - suffix_length, 0), size - 1))
+            continue
+        start = int(m.group(1))
+        if m.group(2) and int(m.group(2)) < start:
+            return None
+        if start < size:
+            end = int(m.group(2)) if m.group(2) else size - 1
+            ranges.append((start, min(end, size - 1)))
+
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    return ranges
+
+
+def range_not_satisfiable(size: int) -> HttpResponse:
+    response = HttpResponse(status=416)
+    response["Content-Range"] = f"bytes */{size}"
+    return response
+
+
+def serve_file(
+    path: Path,
+    byte_range: tuple[int, int],
+    size: int,
+    on_close: Callable[[int], None] | None = None,
+    status: int = 206,
+) -> FileResponse:
+    """Serves a single range with status 206, or the whole file with 200."""
+    start, end = byte_range
+    content_type, encoding = get_content_type(path)
+    # The file is closed by the response.
+    file = open(path, "rb")  # pylint: disable=consider-using-with
+    window = FileWindow(file, start, end - start + 1, on_close)
+    response = FileResponse(window, content_type=content_type, status=status)
+    response.block_size = BLOCK_SIZE
+
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+
+    if status == 206:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Content-Length"] = end - start + 1
+    return response
 
 
 def serve_media(request, path, document_root=None, show_indexes=False):
+    """
+    Like django.views.static.serve, with support for Range requests (which
+    e.g. Safari requires for audio): single and multiple ranges, suffix
+    ranges, If-Range, and 416 responses for unsatisfiable ranges. The file
+    is streamed, so memory use doesn't depend on the size of the range.
+    With the MEDIA_SENDFILE setting, sending the file is left to the web
+    server instead. With LOG_AUDIO_REQUESTS, requests for episode audio are
+    logged, along with the number of bytes sent.
+
+    Responses have ETag and Last-Modified headers, and conditional requests
+    (If-None-Match, If-Modified-Since etc.) are honoured. Content-addressed
+    files (see spodcat.storage) get the MEDIA_IMMUTABLE_CACHE_CONTROL
+    Cache-Control header, since they never change.
+    """
     path = posixpath.normpath(path).lstrip("/")
     fullpath = Path(safe_join(document_root, path))
 
     if not fullpath.is_file():
         return HttpResponseNotFound()
 
-    file_size = fullpath.stat().st_size
-    m = re.match(r"^bytes=(\d*)-(\d*)$", request.headers.get("Range", ""))
+    stat = fullpath.stat()
+    etag = get_etag(path, stat)
+    range_header = request.headers.get("Range")
+    ranges = parse_range_header(range_header, stat.st_size) if range_header else None
+    if ranges is not None and not if_range_matches(request, etag, stat.st_mtime):
+        ranges = None
 
-    if m:
-        range_start = int(m.group(1)) if m.group(1) else 0
-        range_end = int(m.group(2)) if m.group(2) else file_size
-
-        with fullpath.open("rb") as f:
-            f.seek(range_start)
-            buf = BytesIO(f.read(range_end - range_start))
+    if response := get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime)):
+        pass
+    elif response := delegate_to_server(fullpath, path):
+        if on_close := get_log_callback(request, path, 206 if ranges else 200, ranges[0][0] if ranges else None):
+            # We can't know what the server will actually send, so log the
+            # size of what was asked for.
+            on_close(sum(end - start + 1 for start, end in ranges) if ranges else stat.st_size)
+    elif ranges is None:
+        on_close = get_log_callback(request, path, 200, None)
+        response = serve_file(fullpath, (0, stat.st_size - 1), stat.st_size, on_close, status=200)
+    elif not ranges:
+        response = range_not_satisfiable(stat.st_size)
+    elif len(ranges) == 1:
+        on_close = get_log_callback(request, path, 206, ranges[0][0])
+        response = serve_file(fullpath, ranges[0], stat.st_size, on_close)
+    else:
+        on_close = get_log_callback(request, path, 206, ranges[0][0])
+        response = serve_multiple_ranges(fullpath, ranges, stat.st_size, on_close)
 
-        content_type, encoding = mimetypes.guess_type(str(fullpath))
-        response = FileResponse(buf, content_type=content_type, status=206)
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    if spodcat_settings.MEDIA_IMMUTABLE_CACHE_CONTROL and get_blob_sha256(path):
+        response["Cache-Control"] = spodcat_settings.MEDIA_IMMUTABLE_CACHE_CONTROL
+    return response
 
-        if encoding:
-            response.headers["Content-Encoding"] = encoding
 
-        response["Content-Range"] = f"bytes {range_start}-{range_end}/{file_size}"
-        response["Content-Length"] = range_end - range_start
-    else:
-        response = serve(request, path, document_root, show_indexes)
-        response["Content-Length"] = file_size
+def serve_multiple_ranges(
+    path: Path,
+    ranges: list[tuple[int, int]],
+    size: int,
+    on_close: Callable[[int], None] | None = None,
+) -> StreamingHttpResponse:
+    """
+    A multipart/byteranges response, with the Content-Length calculated
+    beforehand.
+    """
+    boundary = uuid.uuid4().hex
+    content_type, _ = get_content_type(path)
+    parts = [
+        (
+            f"--{boundary}\r\nContent-Type: {content_type}\r\nContent-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        ).encode()
+        for start, end in ranges
+    ]
+    closing = f"--{boundary}--\r\n".encode()
+    length = sum(len(part) + end - start + 1 + 2 for part, (start, end) in zip(parts, ranges)) + len(closing)
 
-    response["Accept-Ranges"] = "bytes"
+    response = StreamingHttpResponse(
+        iterate_multipart(path, ranges, parts, closing, on_close),
+        status=206,
+        content_type=f"multipart/byteranges; boundary={boundary}",
+    )
+    response["Content-Length"] = length
     return response
@@ -35,9 +35,25 @@ DJANGO_DEFAULTS = {
 }
 
 DEFAULTS = {
+    "AUDIO_RENDITIONS": [],
     "FRONTEND_ROOT_URL": "http://localhost:4200/",
     "BACKEND_HOST": "http://localhost:8000/",
     "BACKEND_ROOT": "",
+    "DEDUPLICATE_MEDIA": False,
+    "JOB_TIMEOUT": 60 * 60,
+    "JOB_WORKERS": 2,
+    "LOG_ARCHIVE_PATH": "log-archive",
+    "LOG_ARCHIVE_STORAGE": None,
+    "LOG_AUDIO_REQUESTS": False,
+    "LOG_PARTITION_MONTHS_AHEAD": 3,
+    "LOG_RETENTION_MONTHS": None,
+    "MEDIA_ACCEL_REDIRECT_PREFIX": "/protected-media/",
+    "MEDIA_IMMUTABLE_CACHE_CONTROL": "public, max-age=31536000, immutable",
+    "MEDIA_REDIRECT": False,
+    "MEDIA_REDIRECT_URL_TTL": 50 * 60,
+    "MEDIA_SENDFILE": None,
+    "MEDIA_URL_CACHE_TTL": 5 * 60,
+    "RUN_JOBS_IN_PROCESS": False,
 }
 
 
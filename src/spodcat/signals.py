@@ -1,7 +1,10 @@
-from django.db.models.signals import pre_delete
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
-from spodcat.models import Episode, FontFace, Podcast
+from spodcat.media_paths import media_path_index
+from spodcat.media_urls import invalidate_episode_audio_url
+from spodcat.models import Episode, EpisodeRendition, FontFace, Podcast
 from spodcat.utils import delete_storage_file
 
 
@@ -12,6 +15,28 @@ def on_episode_pre_delete(sender, instance: Episode, **kwargs):
     delete_storage_file(instance.image_thumbnail)
 
 
+@receiver(post_delete, sender=Episode, dispatch_uid="on_episode_post_delete_or_save")
+@receiver(post_save, sender=Episode, dispatch_uid="on_episode_post_delete_or_save")
+@receiver(post_delete, sender=EpisodeRendition, dispatch_uid="on_episoderendition_post_delete_or_save")
+@receiver(post_save, sender=EpisodeRendition, dispatch_uid="on_episoderendition_post_delete_or_save")
+def on_audio_file_owner_changed(sender, **kwargs):
+    media_path_index.invalidate()
+
+
+@receiver(post_delete, sender=Episode, dispatch_uid="on_episode_changed")
+@receiver(post_save, sender=Episode, dispatch_uid="on_episode_changed")
+def on_episode_changed(sender, instance: Episode, **kwargs):
+    # After commit, or another process could cache the old URL again in
+    # the meantime.
+    episode_id = str(instance.pk)
+    transaction.on_commit(lambda: invalidate_episode_audio_url(episode_id))
+
+
+@receiver(pre_delete, sender=EpisodeRendition, dispatch_uid="on_episoderendition_pre_delete")
+def on_episoderendition_pre_delete(sender, instance: EpisodeRendition, **kwargs):
+    delete_storage_file(instance.audio_file)
+
+
 @receiver(pre_delete, sender=Podcast, dispatch_uid="on_podcast_pre_delete")
 def on_podcast_pre_delete(sender, instance: Podcast, **kwargs):
     delete_storage_file(instance.banner)
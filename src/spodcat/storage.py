@@ -0,0 +1,181 @@
+"""
+Storage wrappers used for spodcat's file fields: content-addressed storage
+when the DEDUPLICATE_MEDIA setting is on, and URL caching when
+MEDIA_URL_CACHE_TTL is set.
+"""
+import posixpath
+import re
+import threading
+import time
+
+from django.core.files import File
+from django.core.files.storage import Storage
+
+from spodcat.settings import spodcat_settings
+
+
+BLOB_NAME_RE = re.compile(r"^blobs/[0-9a-f]{2}/([0-9a-f]{64})(\.[^/]*)?$")
+
+
+class StorageProxy(Storage):
+    """Passes everything on to `storage`."""
+    def __init__(self, storage: Storage):
+        self.storage = storage
+
+    def __getattr__(self, name):
+        # Backend specific attributes. The check avoids infinite recursion
+        # if self.storage isn't set, e.g. while unpickling.
+        if name == "storage":
+            raise AttributeError(name)
+        return getattr(self.storage, name)
+
+    def _open(self, name, mode="rb"):
+        return self.storage.open(name, mode)
+
+    def delete(self, name):
+        self.storage.delete(name)
+
+    def exists(self, name):
+        return self.storage.exists(name)
+
+    def generate_filename(self, filename):
+        return self.storage.generate_filename(filename)
+
+    def get_accessed_time(self, name):
+        return self.storage.get_accessed_time(name)
+
+    def get_available_name(self, name, max_length=None):
+        return self.storage.get_available_name(name, max_length=max_length)
+
+    def get_created_time(self, name):
+        return self.storage.get_created_time(name)
+
+    def get_modified_time(self, name):
+        return self.storage.get_modified_time(name)
+
+    def get_valid_name(self, name):
+        return self.storage.get_valid_name(name)
+
+    def listdir(self, path):
+        return self.storage.listdir(path)
+
+    def path(self, name):
+        return self.storage.path(name)
+
+    def save(self, name, content, max_length=None):
+        return self.storage.save(name, content, max_length=max_length)
+
+    def size(self, name):
+        return self.storage.size(name)
+
+    def url(self, name):
+        return self.storage.url(name)
+
+
+class UrlCache:
+    """
+    URLs by (storage, name), each kept for `ttl` seconds. When full, the
+    oldest entries are dropped first.
+    """
+    def __init__(self, max_size: int = 100_000):
+        self.entries: dict[tuple[Storage, str], tuple[str, float]] = {}
+        self.lock = threading.Lock()
+        self.max_size = max_size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get(self, storage: Storage, name: str, ttl: float) -> str:
+        key = (storage, name)
+        now = time.monotonic()
+
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+
+        # Generated outside the lock, since it may be slow.
+        url = storage.url(name)
+        with self.lock:
+            self.entries.pop(key, None)
+            while len(self.entries) >= self.max_size:
+                del self.entries[next(iter(self.entries))]
+            self.entries[key] = (url, now + ttl)
+        return url
+
+    def invalidate(self, storage: Storage, name: str):
+        with self.lock:
+            self.entries.pop((storage, name), None)
+
+
+url_cache = UrlCache()
+
+
+class UrlCachingStorage(StorageProxy):
+    """
+    Memoizes url(), which for cloud storages may involve building or
+    signing URLs with their SDK, and is called for every file on every
+    object in feeds and API responses. URLs are kept for
+    MEDIA_URL_CACHE_TTL seconds (which must be shorter than the lifetime
+    of any signed URLs), and are forgotten when a file is saved or deleted
+    through this storage. Cached URLs are shared by all wrappers of the
+    same storage.
+    """
+    def delete(self, name):
+        url_cache.invalidate(self.storage, name)
+        super().delete(name)
+
+    def save(self, name, content, max_length=None):
+        name = super().save(name, content, max_length=max_length)
+        url_cache.invalidate(self.storage, name)
+        return name
+
+    def url(self, name):
+        ttl = spodcat_settings.MEDIA_URL_CACHE_TTL
+        if not ttl or name is None:
+            return self.storage.url(name)
+        return url_cache.get(self.storage, name, ttl)
+
+
+class DeduplicatingStorage(StorageProxy):
+    """
+    Wraps another storage, so that saved files are named after the SHA-256
+    of their contents and identical files are only stored (and uploaded)
+    once. References are counted by spodcat.models.MediaBlob. Deleting a
+    file only removes a reference to it; the file itself is deleted in the
+    background once nothing refers to it any more. Files that were stored
+    before deduplication was turned on are deleted right away, as before.
+    """
+    def __init__(self, storage: Storage, key: str):
+        super().__init__(storage)
+        self.key = key
+
+    def delete(self, name):
+        from spodcat.models import MediaBlob
+
+        if name and not MediaBlob.release(self.key, name):
+            self.storage.delete(name)
+
+    def save(self, name, content, max_length=None):
+        from spodcat.models import MediaBlob
+
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        return MediaBlob.add_reference(self.key, self.storage, name, content)
+
+
+def get_blob_name(sha256: str, name: str) -> str:
+    """`name` is only used for its file extension."""
+    return f"blobs/{sha256[:2]}/{sha256}{posixpath.splitext(name)[1].lower()}"
+
+
+def get_blob_sha256(name: str) -> str | None:
+    """
+    The content hash, if `name` is a content-addressed name as given by
+    get_blob_name(). The contents of such files never change.
+    """
+    m = BLOB_NAME_RE.match(name)
+    return m.group(1) if m else None
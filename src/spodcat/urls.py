@@ -10,6 +10,7 @@ from spodcat.views import (
     PostViewSet,
 )
 from spodcat.views.font_face import font_face_css
+from spodcat.views.media_redirect import episode_audio_redirect
 
 
 router = DefaultRouter()
@@ -26,4 +27,5 @@ app_name = "spodcat"
 urlpatterns = [
     path("", include(router.urls)),
     path("font-faces/", font_face_css, name="font-faces"),
+    path("media/e/<uuid:episode_id>", episode_audio_redirect, name="episode-audio"),
 ]
@@ -1,15 +1,22 @@
 import datetime
 import math
 import os
+import shutil
+import tempfile
+from contextlib import contextmanager
 from io import BytesIO
-from typing import BinaryIO, Generator
+from typing import Generator
 
+from django.core.files import File
 from django.core.files.images import ImageFile
+from django.db.models import QuerySet
 from django.db.models.fields.files import FieldFile, ImageFieldFile
 from django.utils.timezone import get_current_timezone, make_aware
 from PIL import Image
 from pydub import AudioSegment
 
+from spodcat.waveform import CHUNK_SIZE, get_pcm_dbfs_array
+
 
 class Month:
     date: datetime.date
@@ -146,19 +153,56 @@ def generate_thumbnail(from_field: ImageFieldFile, to_field: ImageFieldFile, siz
     return mimetype
 
 
-def get_audio_file_dbfs_array(file: BinaryIO, format_name: str) -> list[float]:
-    audio = AudioSegment.from_file(file, format_name)
-    return get_audio_segment_dbfs_array(audio)
-
-
 def get_audio_segment_dbfs_array(audio: AudioSegment) -> list[float]:
-    dbfs_values = [-100.0 if s.dBFS < -100 else s.dBFS for s in split_audio_segment(audio, 200)]
-    min_dbfs = min(dbfs_values)
-    dbfs_values = [dbfs - min_dbfs for dbfs in dbfs_values]
-    max_dbfs = max(dbfs_values)
-    multiplier = 100 / max_dbfs
-
-    return [dbfs * multiplier for dbfs in dbfs_values]
+    """
+    For audio that is already in memory; see spodcat.audio_analysis for files.
+    """
+    return get_pcm_dbfs_array(
+        data=audio.raw_data,
+        sample_width=audio.sample_width,
+        sample_rate=audio.frame_rate,
+        channels=audio.channels,
+    )
+
+
+@contextmanager
+def local_file_path(file: File, chunk_size: int = CHUNK_SIZE) -> "Generator[str]":
+    """
+    Yields a local filesystem path to `file`'s contents. Files in local
+    storage, and uploads that Django has already written to a temporary
+    file, are used as they are. Anything else (e.g. files in Azure storage)
+    is copied to a temporary file `chunk_size` bytes at a time, so memory
+    use doesn't depend on file size. The file extension is kept, since
+    ffmpeg sometimes needs it to guess the format.
+    """
+    if isinstance(file, FieldFile):
+        try:
+            path = file.storage.path(file.name)
+        except NotImplementedError:
+            path = None
+        if path and os.path.isfile(path):
+            yield path
+            return
+
+    # Not FieldFile.file, since that would open the file from storage.
+    inner = file._file if isinstance(file, FieldFile) else getattr(file, "file", None)
+    for candidate in (file, inner):
+        if hasattr(candidate, "temporary_file_path"):
+            yield candidate.temporary_file_path()
+            return
+
+    _, suffix = os.path.splitext(file.name or "")
+    with tempfile.NamedTemporaryFile(suffix=suffix) as temp_file:
+        was_closed = file.closed
+        file.open("rb")
+        try:
+            file.seek(0)
+            shutil.copyfileobj(file, temp_file, chunk_size)
+        finally:
+            if was_closed:
+                file.close()
+        temp_file.flush()
+        yield temp_file.name
 
 
 def seconds_to_timestamp(value: int):
@@ -175,3 +219,18 @@ def split_audio_segment(whole: AudioSegment, parts: int) -> "Generator[AudioSegm
     while i < len(whole):
         yield whole[i:i + n]
         i += n
+
+
+def update_in_chunks(queryset: QuerySet, chunk_size: int = 1000, **values) -> int:
+    """
+    Updates the rows in `queryset` with `values`, `chunk_size` rows at a
+    time. `queryset` must exclude rows that already have `values`, or this
+    will never finish.
+    """
+    updated = 0
+
+    while True:
+        ids = list(queryset.order_by().values_list("pk", flat=True)[:chunk_size])
+        if not ids:
+            return updated
+        updated += queryset.model.objects.filter(pk__in=ids).update(**values)
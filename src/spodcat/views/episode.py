@@ -1,11 +1,20 @@
 from django.db.models import Prefetch
-from django.http.response import JsonResponse
+from django.http.response import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from django_filters import rest_framework as filters
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ParseError
 from rest_framework.request import Request
+from rest_framework_json_api.utils import (
+    get_resource_type_from_serializer,
+    undo_format_field_name,
+)
 
 from spodcat import serializers
-from spodcat.models import Comment, Episode, PodcastContent
+from spodcat.models import Comment, Episode, EpisodeWaveform, PodcastContent
+from spodcat.models.querysets import EpisodeQuerySet
+from spodcat.waveform import BUCKET_COUNT
 
 from .podcast_content import PodcastContentFilter, PodcastContentViewSet
 
@@ -25,11 +34,39 @@ class EpisodeViewSet(PodcastContentViewSet):
         ],
         "songs": ["songs__artists"],
         "songs.artists": ["songs__artists"],
-        "__all__": ["songs", Prefetch("comments", queryset=Comment.objects.filter(is_approved=True))],
+        "__all__": [
+            "renditions",
+            "songs",
+            Prefetch("comments", queryset=Comment.objects.filter(is_approved=True)),
+        ],
     }
     queryset = Episode.objects.with_has_songs()
     serializer_class = serializers.EpisodeSerializer
 
+    def get_heavy_fields(self) -> list[str]:
+        """
+        The heavy Episode fields that EpisodeSerializer will render: all of
+        them, unless the request has a sparse fieldset that leaves some out.
+        """
+        resource_type = get_resource_type_from_serializer(self.get_serializer_class())
+        fieldset = self.request.query_params.get(f"fields[{resource_type}]")
+        if fieldset is None:
+            return list(EpisodeQuerySet.heavy_fields)
+
+        field_names = {undo_format_field_name(name) for name in fieldset.split(",")}
+        if "description_html" in field_names:
+            field_names.add("description")
+        return [f for f in EpisodeQuerySet.heavy_fields if f in field_names]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ("list", "retrieve"):
+            # The other actions don't render any of them.
+            heavy_fields = self.get_heavy_fields()
+            if heavy_fields:
+                return queryset.with_heavy_fields(*heavy_fields)
+        return queryset
+
     @action(methods=["get"], detail=True)
     def chapters(self, request: Request, pk: str):
         # https://github.com/Podcastindex-org/podcast-namespace/blob/main/docs/examples/chapters/jsonChapters.md
@@ -55,3 +92,36 @@ class EpisodeViewSet(PodcastContentViewSet):
             content_type="application/json+chapters",
             headers={"Content-Disposition": f"attachment; filename=\"{episode.id}.chapters.json\""},
         )
+
+    @action(methods=["get"], detail=True)
+    def waveform(self, request: Request, pk: str):
+        """
+        The episode's waveform as raw bytes, one unsigned byte (0-255) per
+        bucket. `res` is the wanted number of buckets; the lowest available
+        resolution at or above it is returned, or the highest one there is.
+        """
+        try:
+            resolution = int(request.query_params.get("res", BUCKET_COUNT))
+        except ValueError as e:
+            raise ParseError("res must be an integer.") from e
+
+        episode = self.get_object()
+        waveforms = EpisodeWaveform.objects.filter(episode=episode)
+        waveform = waveforms.filter(resolution__gte=resolution).order_by("resolution").first()
+        if waveform is None:
+            waveform = waveforms.order_by("-resolution").first()
+        if waveform is None:
+            raise NotFound()
+
+        # Changes whenever the audio file is analyzed again.
+        etag = quote_etag(f"{waveform.pk}-{waveform.resolution}-{int(waveform.updated.timestamp())}")
+        last_modified = int(waveform.updated.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+        if response is None:
+            response = HttpResponse(bytes(waveform.data), content_type="application/octet-stream")
+
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        patch_cache_control(response, public=True, max_age=60 * 60 * 24, stale_while_revalidate=60 * 60 * 24 * 30)
+        return response
@@ -0,0 +1,44 @@
+from django.http import HttpRequest, HttpResponseNotFound, HttpResponseRedirect
+from django.utils import timezone
+from django.utils.cache import add_never_cache_headers
+
+from spodcat.logs.writer import log_audio_request
+from spodcat.media_urls import get_episode_audio_url
+from spodcat.serve_media import parse_range_header
+from spodcat.settings import spodcat_settings
+
+
+def episode_audio_redirect(request: HttpRequest, episode_id):
+    """
+    Redirects to the storage URL of the episode's audio file (see the
+    MEDIA_REDIRECT setting). With LOG_AUDIO_REQUESTS, the request is logged
+    with the size of what was asked for, since the actual transfer happens
+    elsewhere.
+    """
+    started = timezone.now()
+    audio_url = get_episode_audio_url(str(episode_id))
+    if audio_url is None:
+        return HttpResponseNotFound()
+
+    response = HttpResponseRedirect(audio_url.url)
+    # Or else caching proxies would keep us from logging repeat requests,
+    # and might hold on to the URL past its expiry.
+    add_never_cache_headers(response)
+
+    if spodcat_settings.LOG_AUDIO_REQUESTS:
+        size = audio_url.length or 0
+        range_header = request.headers.get("Range")
+        ranges = parse_range_header(range_header, size) if range_header and size else None
+        if ranges:
+            size = sum(end - start + 1 for start, end in ranges)
+
+        log_audio_request(
+            request,
+            str(episode_id),
+            started,
+            response.status_code,
+            ranges[0][0] if ranges else None,
+            size,
+        )
+
+    return response
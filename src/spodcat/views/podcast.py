@@ -66,13 +66,10 @@ class PodcastViewSet(views.ReadOnlyModelViewSet):
         permission_classes=[IsAuthenticated],
     )
     def chart(self, request: Request):
-        from spodcat.logs.models import (
-            PodcastEpisodeAudioRequestLog,
-            PodcastRssRequestLog,
-        )
+        from spodcat.logs.models import ListeningSession, PodcastRssRequestLog
 
         chart_type = request.query_params["type"]
-        chart_qs = PodcastEpisodeAudioRequestLog.objects.filter(is_bot=False).filter_by_user(request.user)
+        chart_qs = ListeningSession.objects.filter(is_bot=False).filter_by_user(request.user)
         chart_data: ChartData | None = None
         start_date = self.get_chart_start_date(request)
         end_date = self.get_chart_end_date(request)
@@ -85,7 +82,7 @@ class PodcastViewSet(views.ReadOnlyModelViewSet):
             chart_js = (
                 PodcastRssRequestLog.objects
                 .filter(is_bot=False)
-                .exclude(user_agent="")
+                .exclude(user_agent=None)
                 .filter_by_user(request.user)
             )
             chart_data = chart_js.get_unique_ips_chart_data(start_date, end_date).fill_empty_points()
@@ -106,11 +103,11 @@ class PodcastViewSet(views.ReadOnlyModelViewSet):
         permission_classes=[IsAuthenticated],
     )
     def detail_chart(self, request: Request, pk: str):
-        from spodcat.logs.models import PodcastEpisodeAudioRequestLog
+        from spodcat.logs.models import ListeningSession
 
         chart_type = request.query_params["type"]
         chart_qs = (
-            PodcastEpisodeAudioRequestLog.objects
+            ListeningSession.objects
             .filter(is_bot=False, episode__podcast=pk)
             .filter_by_user(request.user)
         )
@@ -159,7 +156,14 @@ class PodcastViewSet(views.ReadOnlyModelViewSet):
         podcast: Podcast = get_object_or_404(queryset, slug=pk)
         authors = [{"name": o.get_full_name(), "email": o.email} for o in podcast.authors.all()]
         categories = [c.to_dict() for c in podcast.categories.all()]
-        episode_qs = Episode.objects.filter(podcast=podcast).listed().with_has_chapters()
+        episode_qs = (
+            Episode.objects
+            .with_heavy_fields("description")
+            .filter(podcast=podcast)
+            .listed()
+            .with_has_chapters()
+            .prefetch_related("renditions")
+        )
         last_published = episode_qs.aggregate(last_published=Max("published"))["last_published"]
         author_string = ", ".join([a["name"] for a in authors if a["name"]])
 
@@ -224,11 +228,28 @@ class PodcastViewSet(views.ReadOnlyModelViewSet):
                 fe.podcast.itunes_image(episode.image.url)
                 fe.podcast2.podcast_image(episode.image.url, episode.image_width)
             if episode.audio_file:
+                audio_url = episode.get_audio_url()
                 fe.enclosure(
-                    url=episode.audio_file.url,
+                    url=audio_url,
                     type=episode.audio_content_type,
                     length=episode.audio_file_length,
                 )
+                renditions = episode.renditions.all()
+                if renditions:
+                    fe.podcast2.podcast_alternate_enclosure(
+                        url=audio_url,
+                        type_=episode.audio_content_type,
+                        length=episode.audio_file_length,
+                        default=True,
+                    )
+                for rendition in renditions:
+                    fe.podcast2.podcast_alternate_enclosure(
+                        url=rendition.audio_file.url,
+                        type_=rendition.content_type,
+                        length=rendition.length,
+                        bitrate=rendition.bit_rate,
+                        title=rendition.name,
+                    )
             fe.guid(guid=str(episode.id), permalink=False)
             if authors:
                 fe.author(authors)
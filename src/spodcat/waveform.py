@@ -0,0 +1,229 @@
+"""
+Waveform (dBFS array) calculation with NumPy. Audio files are decoded and
+streamed through DbfsAccumulator by spodcat.audio_analysis.
+"""
+import math
+
+import numpy as np
+
+
+BUCKET_COUNT = 200
+CHUNK_SIZE = 256 * 1024
+# Bucket length of FineDbfsAccumulator.
+FINE_BUCKET_MS = 10
+MIN_DBFS = -100.0
+# Bucket counts of the waveform pyramid (see EpisodeWaveform).
+PYRAMID_RESOLUTIONS = (200, 1000, 5000)
+SAMPLE_WIDTH = 2
+
+
+class DbfsAccumulator:
+    """
+    Incrementally calculates the dBFS of consecutive buckets of `bucket_ms`
+    milliseconds each. Memory use is independent of input length. Takes
+    either raw PCM data or squared samples; the latter so that several
+    accumulators with different bucket sizes can share the conversion.
+    """
+    def __init__(self, bucket_ms: int, sample_rate: int, channels: int, bucket_count: int = BUCKET_COUNT):
+        self.bucket_count = bucket_count
+        self.bucket_ms = max(bucket_ms, 1)
+        self.channels = channels
+        self.current_size = 0
+        self.current_sum_squares = 0.0
+        self.position = 0
+        self.sample_rate = sample_rate
+        self.values: list[float] = []
+
+    @property
+    def bucket_end(self) -> int | None:
+        # Anything exceeding the expected duration goes into the last
+        # bucket, so there are never more than bucket_count values.
+        if len(self.values) >= self.bucket_count - 1:
+            return None
+        return ms_to_frame((len(self.values) + 1) * self.bucket_ms, self.sample_rate) * self.channels
+
+    def add(self, data: bytes):
+        self.add_squares(get_squares(get_samples(data, SAMPLE_WIDTH)))
+
+    def add_squares(self, squares: np.ndarray):
+        while len(squares):
+            bucket_end = self.bucket_end
+            fragment = squares if bucket_end is None else squares[:bucket_end - self.position]
+            self.current_sum_squares += float(fragment.sum())
+            self.current_size += len(fragment)
+            self.position += len(fragment)
+            squares = squares[len(fragment):]
+
+            if bucket_end is not None and self.position >= bucket_end:
+                self.finish_bucket()
+
+    def finish(self) -> list[float]:
+        # AudioSegment slicing drops a trailing fraction of a millisecond,
+        # so we do too.
+        min_size = math.ceil(self.sample_rate / 1000) * self.channels
+        if self.current_size >= min_size or (self.current_size and not self.values):
+            self.finish_bucket()
+        return self.values
+
+    def finish_bucket(self):
+        dbfs = get_dbfs_values(
+            sum_squares=np.array([self.current_sum_squares]),
+            sample_counts=np.array([self.current_size]),
+            sample_width=SAMPLE_WIDTH,
+        )
+        self.values.append(dbfs[0])
+        self.current_size = 0
+        self.current_sum_squares = 0.0
+
+
+class FineDbfsAccumulator:
+    """
+    For audio whose duration isn't known beforehand: collects sums of
+    squared samples in buckets of FINE_BUCKET_MS, which are rebinned into
+    any number of buckets by get_dbfs_values() once all audio has been
+    added. Uses 8 bytes per bucket, i.e. about 6 MB for two hours.
+    """
+    def __init__(self, sample_rate: int, channels: int):
+        self.bucket_size = max(ms_to_frame(FINE_BUCKET_MS, sample_rate), 1) * channels
+        self.channels = channels
+        self.remainder = np.empty(0)
+        self.sample_count = 0
+        self.sample_rate = sample_rate
+        self.sums: list[np.ndarray] = []
+
+    def add_squares(self, squares: np.ndarray):
+        self.sample_count += len(squares)
+        if len(self.remainder):
+            squares = np.concatenate([self.remainder, squares])
+        size = len(squares) // self.bucket_size * self.bucket_size
+        if size:
+            self.sums.append(squares[:size].reshape(-1, self.bucket_size).sum(axis=1))
+        self.remainder = squares[size:]
+
+    def get_dbfs_values(self, bucket_count: int = BUCKET_COUNT) -> list[float]:
+        """
+        dBFS values for buckets of the same length as get_bucket_ms() gives
+        for the decoded duration. Bucket bounds are rounded to the nearest
+        fine bucket.
+        """
+        length_ms = round(self.sample_count / self.channels / self.sample_rate * 1000)
+        if not length_ms:
+            return []
+
+        sums = np.concatenate([*self.sums, [self.remainder.sum()] if len(self.remainder) else []])
+        cumulative = np.concatenate([[0.0], np.cumsum(sums)])
+        bucket_ms = math.ceil(length_ms / bucket_count)
+        bounds = np.array([ms_to_frame(ms, self.sample_rate) * self.channels for ms in range(0, length_ms, bucket_ms)])
+        starts = np.minimum(np.rint(bounds / self.bucket_size).astype(np.int64), len(sums) - 1)
+        # Buckets shorter than a fine bucket share one with their neighbour,
+        # rather than being empty.
+        ends = np.minimum(np.maximum(np.append(starts[1:], len(sums)), starts + 1), len(sums))
+        positions = np.minimum(np.arange(len(sums) + 1) * self.bucket_size, self.sample_count)
+
+        return get_dbfs_values(
+            sum_squares=cumulative[ends] - cumulative[starts],
+            sample_counts=positions[ends] - positions[starts],
+            sample_width=SAMPLE_WIDTH,
+        )
+
+
+def get_bucket_ms(duration_seconds: float, bucket_count: int = BUCKET_COUNT) -> int:
+    # Same bucket length as split_audio_segment().
+    return math.ceil(round(duration_seconds * 1000) / bucket_count)
+
+
+def get_dbfs_values(sum_squares: np.ndarray, sample_counts: np.ndarray, sample_width: int) -> list[float]:
+    """
+    Converts per-bucket sums of squared samples to dBFS values, clamped to
+    MIN_DBFS. RMS values are floored like in audioop.rms(), which
+    AudioSegment.dBFS uses, so results are identical to pydub's.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rms = np.floor(np.sqrt(sum_squares / sample_counts))
+        dbfs = 20 * np.log10(rms / (2 ** (sample_width * 8 - 1)))
+    return np.maximum(np.nan_to_num(dbfs, nan=MIN_DBFS), MIN_DBFS).tolist()
+
+
+def get_pcm_dbfs_array(
+    data: bytes,
+    sample_width: int,
+    sample_rate: int,
+    channels: int,
+    bucket_count: int = BUCKET_COUNT,
+) -> list[float]:
+    """
+    Vectorized equivalent of splitting an AudioSegment with
+    split_audio_segment() and getting the dBFS of each part. `data` is
+    viewed as a NumPy array without copying (except for 24 bit data), and
+    only one bucket at a time is converted to floats.
+    """
+    samples = get_samples(data, sample_width)
+    length_ms = round(len(samples) / channels / sample_rate * 1000)
+    if not length_ms:
+        return []
+
+    bucket_ms = math.ceil(length_ms / bucket_count)
+    starts = range(0, length_ms, bucket_ms)
+    frames = [ms_to_frame(ms, sample_rate) for ms in [*starts, length_ms]]
+    bounds = [frame * channels for frame in frames]
+
+    sum_squares = np.array([get_sum_squares(samples[start:end]) for start, end in zip(bounds, bounds[1:])])
+    sample_counts = np.diff(bounds)
+
+    return normalize_dbfs_values(get_dbfs_values(sum_squares, sample_counts, sample_width))
+
+
+def get_samples(data: bytes | memoryview, sample_width: int) -> np.ndarray:
+    """
+    Returns signed little-endian PCM samples as a NumPy array. For 8, 16
+    and 32 bit data, this is a view on `data`. 24 bit data has no NumPy
+    dtype, so it has to be copied into a 32 bit array.
+    """
+    count = len(data) // sample_width
+
+    if sample_width == 3:
+        # Put each sample in the 3 high bytes of an int32 and shift back,
+        # which keeps the sign.
+        padded = np.zeros((count, 4), dtype=np.uint8)
+        padded[:, 1:] = np.frombuffer(data, dtype=np.uint8, count=count * 3).reshape(-1, 3)
+        return padded.view("<i4").reshape(-1) >> 8
+
+    dtype = {1: np.dtype("i1"), 2: np.dtype("<i2"), 4: np.dtype("<i4")}[sample_width]
+    return np.frombuffer(data, dtype=dtype, count=count)
+
+
+def get_squares(samples: np.ndarray) -> np.ndarray:
+    floats = samples.astype(np.float64)
+    return floats * floats
+
+
+def get_sum_squares(samples: np.ndarray) -> float:
+    floats = samples.astype(np.float64)
+    return float(np.dot(floats, floats))
+
+
+def ms_to_frame(ms: int, sample_rate: int) -> int:
+    # Same rounding as AudioSegment slicing.
+    return int(ms * (sample_rate / 1000.0))
+
+
+def normalize_dbfs_values(dbfs_values: list[float]) -> list[float]:
+    """Scales the values so that the lowest is 0 and the highest is 100."""
+    if not dbfs_values:
+        return []
+
+    min_dbfs = min(dbfs_values)
+    dbfs_values = [dbfs - min_dbfs for dbfs in dbfs_values]
+    max_dbfs = max(dbfs_values)
+    multiplier = 100 / max_dbfs if max_dbfs else 0
+
+    return [dbfs * multiplier for dbfs in dbfs_values]
+
+
+def pack_dbfs_values(normalized_values: list[float]) -> bytes:
+    """
+    Packs normalized (0-100) dBFS values as one unsigned byte each, which
+    is plenty of precision for drawing a waveform.
+    """
+    values = np.clip(np.rint(np.array(normalized_values, dtype=np.float64) * 2.55), 0, 255)
+    return values.astype(np.uint8).tobytes()